@@ -0,0 +1,277 @@
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import time
+
+from animation import ATTACK1, HIT
+from controls import LEFT, RIGHT, PRESS_LEFT, PRESS_RIGHT, JUMP, ATTACK, TRANSFORM
+from simulation import RUN_SPEED, step
+
+# CPU opponents. A policy is called once per tick as policy(state, index)
+# and returns the same input bits a keyboard would for that fighter, so it
+# can stand in for either player in main.py, batch.py or netplay.
+#
+#   python ai.py --policy lookahead --opponent utility --matches 200
+
+
+# The parts of the match a policy looks at, from one fighter's side
+class Observation:
+    def __init__(self, state, index):
+        me = state.fighters[index]
+        other = state.fighters[1 - index]
+        self.me = me
+        self.other = other
+        self.dx = other.position.x - me.position.x
+        self.dy = other.position.y - me.position.y
+        self.hp = me.health_comp.current_hp
+        self.other_hp = other.health_comp.current_hp
+        self.grounded = me.velocity.y == 0
+        # How far the attack box is from the opponent: <= 0 means an attack
+        # started now would reach, otherwise the signed distance to close
+        box_x, _, box_w, _ = me.attack_box()
+        left = me.position.x + box_x
+        right = left + box_w
+        if right < other.position.x:
+            self.gap = other.position.x - right
+        elif left > other.position.x + other.sprite_width:
+            self.gap = other.position.x + other.sprite_width - left
+        else:
+            self.gap = 0
+        # Ticks until the opponent's swing lands (None when it isn't swinging
+        # or is already past its hit frame)
+        self.incoming = None
+        if other.is_attacking and other.animation_id == ATTACK1:
+            hit = other.states.last_event[ATTACK1].get(HIT)
+            if hit is not None and other.frames_current <= hit:
+                hold = other.frames_hold
+                self.incoming = (hit - other.frames_current) * hold - other.frames_elapsed % hold
+
+    def can_transform(self):
+        return self.me.transform_count < 2 and not self.me.transform_active
+
+
+# Held direction plus a press whenever it changes, like KeyboardInput
+class Steering:
+    def __init__(self):
+        self.direction = 0
+
+    def bits(self, direction):
+        bits = direction
+        if direction != self.direction:
+            if direction == LEFT:
+                bits |= PRESS_LEFT
+            elif direction == RIGHT:
+                bits |= PRESS_RIGHT
+            self.direction = direction
+        return bits
+
+
+def toward(distance):
+    return RIGHT if distance > 0 else LEFT if distance < 0 else 0
+
+
+# Scores a handful of actions from the observation each tick and plays the
+# best one. Cheap enough to run for both fighters every tick.
+class UtilityPolicy:
+    def __init__(self, rng, noise=0.15, transform_hp=50):
+        self.rng = rng
+        self.noise = noise
+        self.transform_hp = transform_hp
+        self.steering = Steering()
+
+    def scores(self, obs):
+        me = obs.me
+        in_reach = obs.gap == 0 and abs(obs.dy) < me.attack_box_size[1]
+        scores = {
+            'idle': 0.1,
+            'attack': 1.0 if in_reach and not me.is_attacking else 0,
+            'approach': min(1.0, abs(obs.gap) / 300) if obs.gap else 0,
+            'retreat': 0,
+            'jump': 0,
+            'transform': 0,
+        }
+        if obs.incoming is not None and abs(obs.dx) < 300:
+            # Step back from a swing that's about to land, or hop over it
+            scores['retreat'] = 0.9 if obs.hp <= obs.other_hp else 0.6
+            if obs.grounded and me.jumps_left > 0:
+                scores['jump'] = 0.7
+        if obs.hp < self.transform_hp and obs.can_transform():
+            scores['transform'] = 0.95
+        return scores
+
+    def __call__(self, state, index):
+        obs = Observation(state, index)
+        scores = self.scores(obs)
+        action = max(scores, key=lambda name: scores[name] + self.rng.random() * self.noise)
+
+        direction = 0
+        bits = 0
+        if action == 'approach':
+            direction = toward(obs.gap)
+        elif action == 'retreat':
+            direction = toward(-obs.dx)
+        elif action == 'attack':
+            bits = ATTACK
+        elif action == 'jump':
+            bits = JUMP
+            direction = toward(-obs.dx)
+        elif action == 'transform':
+            bits = TRANSFORM
+        return bits | self.steering.bits(direction)
+
+
+# Six actions at full depth, about 5 ms (see the lookahead_search benchmark)
+MAX_SEARCH_STEPS = 6 * 24
+# Wall-clock limit for searches in the interactive game
+FRAME_BUDGET = 0.005
+
+
+# Tries every action in ACTIONS for `depth` ticks with the real simulation
+# step (on a snapshot that's restored afterwards) and plays the one that
+# scores best, re-planning every `interval` ticks. The opponent is played
+# by a noiseless UtilityPolicy during the search.
+#
+# A search stops after `max_steps` simulated ticks (None: no limit), which
+# keeps it inside a frame and plays the same on every machine, so batch
+# runs are reproducible. Interactive play can also set `budget` seconds;
+# the remaining actions are then skipped on a slow machine instead of
+# dropping frames, at the cost of determinism.
+#
+# Rollouts go through simulation.step one after another rather than side
+# by side in bulk.BulkMatches: the opponent model reads Fighter objects
+# and bulk doesn't do per-frame hitboxes, so a bulk rollout would play a
+# slightly different game than the one being planned for.
+class LookaheadPolicy:
+    # Most useful first, for when a limit cuts the search short
+    ACTIONS = (ATTACK, 0, LEFT, RIGHT, JUMP, TRANSFORM, LEFT | JUMP, RIGHT | JUMP)
+
+    def __init__(self, rng, depth=24, interval=6, max_steps=MAX_SEARCH_STEPS, budget=None):
+        self.rng = rng
+        self.depth = depth
+        self.interval = interval
+        self.max_steps = max_steps
+        self.budget = budget
+        self.model = UtilityPolicy(rng, noise=0)
+        self.buffer = None
+        self.plan = 0
+        self.plan_ticks = 0
+        self.steering = Steering()
+        # Searches run and the slowest one in seconds, for checking the frame
+        # budget (totals, so a kiosk running for days doesn't grow a list)
+        self.searches = 0
+        self.slowest_search = 0.0
+
+    def __call__(self, state, index):
+        if self.plan_ticks <= 0:
+            started = time.perf_counter()
+            self.plan = self.search(state, index)
+            self.searches += 1
+            self.slowest_search = max(self.slowest_search, time.perf_counter() - started)
+            self.plan_ticks = self.interval
+            # Buttons are pressed once, on the first tick of the plan
+            bits = self.plan & (JUMP | ATTACK | TRANSFORM)
+        else:
+            bits = 0
+        self.plan_ticks -= 1
+        return bits | self.steering.bits(self.plan & (LEFT | RIGHT))
+
+    def search(self, state, index):
+        deadline = None if self.budget is None else time.perf_counter() + self.budget
+        steps = 0
+        if self.buffer is None:
+            self.buffer = state.new_state_buffer()
+        state.save_state(self.buffer)
+        me = state.fighters[index]
+        model = self.model
+        held = state.last_keys[1 - index] if state.fighters[1 - index].velocity.x else 0
+
+        best = None
+        best_score = None
+        for action in self.ACTIONS:
+            if action & TRANSFORM and me.transform_count >= 2:
+                continue
+            direction = action & (LEFT | RIGHT)
+            model.steering.direction = held
+            inputs = [0, 0]
+            # Press on the first tick, then hold the direction
+            inputs[index] = action | (PRESS_LEFT if direction == LEFT else PRESS_RIGHT if direction == RIGHT else 0)
+            for _ in range(self.depth):
+                inputs[1 - index] = model(state, 1 - index)
+                step(state, inputs)
+                steps += 1
+                if state.game_over:
+                    break
+                inputs[index] = direction
+            score = self.evaluate(state, index) + self.rng.random() * 0.01
+            if best_score is None or score > best_score:
+                best, best_score = action, score
+            state.load_state(self.buffer)
+            if self.max_steps is not None and steps >= self.max_steps:
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        return best
+
+    def evaluate(self, state, index):
+        obs = Observation(state, index)
+        score = (obs.hp - obs.other_hp) * 10
+        if state.game_over:
+            score += 1000 if obs.other_hp <= 0 < obs.hp else -1000 if obs.hp <= 0 else 0
+        # Prefer ending up within reach, and not wasting transforms
+        score -= abs(obs.gap) / RUN_SPEED * 0.1
+        score -= obs.me.transform_count * 5
+        return score
+
+
+POLICIES = {
+    'utility': UtilityPolicy,
+    'lookahead': LookaheadPolicy,
+}
+
+
+def parse_args(argv=None):
+    from batch import POLICIES as ALL_POLICIES
+    parser = argparse.ArgumentParser(description="Play CPU policies against each other across a process pool.")
+    parser.add_argument('--policy', choices=sorted(ALL_POLICIES), default='lookahead', help="plays the player side")
+    parser.add_argument('--opponent', choices=sorted(ALL_POLICIES), default='utility', help="plays the enemy side")
+    parser.add_argument('--matches', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--player-character', default='samuraiMack')
+    parser.add_argument('--enemy-character', default='kenji')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import batch
+    args = parse_args(argv)
+    batch_args = batch.parse_args([
+        '--policy', args.policy, '--enemy-policy', args.opponent,
+        '--matches', str(args.matches), '--workers', str(args.workers), '--seed', str(args.seed),
+        '--player-character', args.player_character, '--enemy-character', args.enemy_character,
+    ])
+    wins = {}
+    ticks = 0
+    search_ms = []
+    started = time.perf_counter()
+    for result in batch.run_batch(batch_args):
+        wins[result['winner']] = wins.get(result['winner'], 0) + 1
+        ticks += result['ticks']
+        if result['search_ms'] is not None:
+            search_ms.append(result['search_ms'])
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.policy} vs {args.opponent}, {args.matches} matches in {elapsed:.1f}s")
+    for winner, count in sorted(wins.items()):
+        print(f"  {winner}: {count} ({count / args.matches:.0%})")
+    print(f"  average length {ticks / args.matches / 60:.1f}s")
+    if search_ms:
+        # Each match reports its slowest search; a tick is 16.7 ms
+        search_ms.sort()
+        print(f"  slowest search per match: median {search_ms[len(search_ms) // 2]:.2f} ms, "
+              f"worst {search_ms[-1]:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# Animation states for fighters. Every character uses the same integer ids
+# for the standard animations (extra sprites get ids after them), and the
+# rules for which animation may replace which are compiled once per
+# character into lookup tables, so switching is a couple of list indexes.
+ANIMATIONS = ('idle', 'run', 'jump', 'fall', 'attack1', 'takeHit', 'death')
+IDLE, RUN, JUMP_ANIM, FALL, ATTACK1, TAKE_HIT, DEATH = range(len(ANIMATIONS))
+
+# What a switch request does
+STAY, SWITCH, DIE = range(3)
+
+# Animations that play to their last frame before anything else can start.
+# Death is final: once it has played the fighter is dead.
+LOCKED = (DEATH, TAKE_HIT, ATTACK1)
+# Animations allowed to cut a locked one short, e.g. {ATTACK1: (TAKE_HIT, DEATH)}
+# to let hits interrupt attacks. Empty keeps the original rules, where
+# attacks and hit reactions always finish.
+INTERRUPTS = {}
+
+# Frame event names, see AnimationStates.events. FLASH only changes how
+# the frame is drawn (the white hit-flash variant, see variants.py).
+HIT = 'hit'
+FLASH = 'flash'
+
+
+def default_events(hit_frame):
+    # Characters without an events table hit on one frame of attack1 and
+    # flash white on the second frame of takeHit
+    return {'attack1': {hit_frame: HIT}, 'takeHit': {1: FLASH}}
+
+
+class AnimationStates:
+    def __init__(self, sprites, events=None):
+        self.names = ANIMATIONS + tuple(name for name in sprites if name not in ANIMATIONS)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        count = len(self.names)
+        self.frames_max = [sprites[name]['framesMax'] if name in sprites else 0 for name in self.names]
+        # Animations drawn from the same sheet count as the same animation,
+        # like the old Surface comparisons
+        sheets = [sprites[name]['imageSrc'] if name in sprites else None for name in self.names]
+
+        # The locked animation each state plays as (by sheet), and the frame
+        # from which it counts as finished
+        self.lock = [None] * count
+        self.lock_end = [0] * count
+        for state in range(count):
+            for locked in LOCKED:
+                if sheets[state] is not None and sheets[state] == sheets[locked]:
+                    self.lock[state] = locked
+                    self.lock_end[state] = self.frames_max[locked] - 1
+                    break
+
+        # transitions[finished][current][target]
+        self.transitions = tuple(
+            [[self._rule(current, target, finished, sheets) for target in range(count)] for current in range(count)]
+            for finished in (False, True)
+        )
+
+        # events[state][frame]: name of the event on that frame, or None;
+        # last_event[state][name]: the last frame that event happens on
+        self.events = []
+        self.last_event = []
+        for state, name in enumerate(self.names):
+            table = [None] * self.frames_max[state]
+            last = {}
+            for frame, event in sorted((int(f), e) for f, e in (events or {}).get(name, {}).items()):
+                if frame < len(table):
+                    table[frame] = event
+                    last[event] = frame
+            self.events.append(table)
+            self.last_event.append(last)
+
+    def _rule(self, current, target, finished, sheets):
+        lock = self.lock[current]
+        if lock == DEATH:
+            return DIE if finished else STAY
+        if lock is not None and not finished and target not in INTERRUPTS.get(lock, ()):
+            return STAY
+        if sheets[target] is None or sheets[target] == sheets[current]:
+            return STAY
+        return SWITCH
+
+    def transition(self, current, target, frame):
+        return self.transitions[frame >= self.lock_end[current]][current][target]
+
+    def event(self, state, frame):
+        table = self.events[state]
+        return table[frame] if frame < len(table) else None
@@ -0,0 +1,115 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+
+# Threads decoding PNGs in the background (SDL_image releases the GIL)
+DECODE_WORKERS = min(4, os.cpu_count() or 1)
+
+
+# Process-wide image registry: every file path is decoded once and the same
+# Surface is handed to every Sprite/Fighter that asks for it.
+class AssetManager:
+    def __init__(self):
+        self.surfaces = {}
+        self.converted = set()
+        # Sprites holding each surface; see release() and purge()
+        self.ref_counts = {}
+        # Decodes queued by preload(): path -> Future of the decoded surface
+        self.pending = {}
+        self.executor = None
+
+    def key(self, path):
+        return os.path.abspath(path)
+
+    def load(self, path):
+        key = self.key(path)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            future = self.pending.pop(key, None)
+            # Still queued or decoding: wait for just this file
+            surface = future.result() if future else pygame.image.load(key)
+            self.surfaces[key] = surface
+
+        # convert_alpha needs a display mode, so headless runs keep the decoded
+        # surface and convert it the first time it is requested with a window
+        if key not in self.converted and pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+            self.surfaces[key] = surface
+            self.converted.add(key)
+
+        self.ref_counts[key] = self.ref_counts.get(key, 0) + 1
+        return surface
+
+    def release(self, path):
+        key = self.key(path)
+        if self.ref_counts.get(key, 0) > 0:
+            self.ref_counts[key] -= 1
+
+    def purge(self):
+        # Drop every surface nobody holds a reference to (e.g. after a roster change)
+        for key, count in list(self.ref_counts.items()):
+            if count == 0:
+                self.surfaces.pop(key, None)
+                self.converted.discard(key)
+                del self.ref_counts[key]
+
+    def size(self, path):
+        # (width, height) without decoding: from the surface if it is loaded,
+        # otherwise from the PNG header
+        surface = self.surfaces.get(self.key(path))
+        if surface is not None:
+            return surface.get_size()
+        with open(self.key(path), 'rb') as f:
+            header = f.read(24)
+        if header[:8] != b'\x89PNG\r\n\x1a\n':
+            return pygame.image.load(self.key(path)).get_size()
+        return struct.unpack('>II', header[16:24])
+
+    def memory_bytes(self):
+        return sum(s.get_pitch() * s.get_height() for s in self.surfaces.values())
+
+    def preload(self, paths, background=True):
+        # Queue files for decoding on the thread pool, in the order given:
+        # ask for what is needed first before what can wait
+        keys = []
+        for path in paths:
+            key = self.key(path)
+            if key not in self.surfaces and key not in self.pending and key not in keys:
+                keys.append(key)
+
+        if not background:
+            for key in keys:
+                self.surfaces[key] = pygame.image.load(key)
+            return
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(DECODE_WORKERS, thread_name_prefix='decode')
+        for key in keys:
+            self.pending[key] = self.executor.submit(pygame.image.load, key)
+
+    def convert_ready(self):
+        # Called from the main thread every frame: moves finished decodes into
+        # the registry, converted for the display if there is one
+        for key, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            surface = future.result()
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert_alpha()
+                self.converted.add(key)
+            self.surfaces[key] = surface
+
+    def progress(self, paths):
+        # (ready, total) for a loading screen
+        keys = {self.key(path) for path in paths}
+        ready = sum(1 for key in keys if key in self.surfaces or (key in self.pending and self.pending[key].done()))
+        return ready, len(keys)
+
+    def is_ready(self, paths):
+        ready, total = self.progress(paths)
+        return ready == total
+
+
+assets = AssetManager()
@@ -0,0 +1,126 @@
+from collections import namedtuple
+import pygame
+from variants import PLAIN, apply_variant
+
+# page:  index into TextureAtlas.pages
+# rect:  where the trimmed frame sits on that page
+# trim:  top-left of the trimmed area inside the original frame (the anchor
+#        for drawing: blit at the frame's position + trim)
+# size:  size of the original, untrimmed frame
+AtlasFrame = namedtuple('AtlasFrame', 'page rect trim size')
+
+
+# Packs every animation frame of the fighters into a few large surfaces,
+# trimming the transparent margin around each frame. Each requested sprite
+# variant (see variants.py) gets its own copy of the pages, made when
+# packing; a mirrored page has every frame at the mirrored spot.
+class TextureAtlas:
+    def __init__(self, page_size=2048, padding=1):
+        self.page_size = page_size
+        self.padding = padding
+        self.pages = []
+        self.frames = {}
+        self.pending = []
+        self.pending_keys = set()
+        self.variants = set()
+        self.variant_pages = {}
+
+    def add_sheet(self, image, frames_max):
+        frame_width = image.get_width() // frames_max
+        frame_height = image.get_height()
+        for index in range(frames_max):
+            key = (image, index, frame_width)
+            if key in self.frames or key in self.pending_keys:
+                continue
+            frame = image.subsurface(pygame.Rect(index * frame_width, 0, frame_width, frame_height))
+            trim = frame.get_bounding_rect()
+            if trim.width == 0 or trim.height == 0:
+                # Fully transparent frame, keep a single pixel
+                trim = pygame.Rect(0, 0, 1, 1)
+            self.pending.append((key, frame, trim))
+            self.pending_keys.add(key)
+
+    def add_fighter(self, fighter):
+        # Sprites that aren't loaded yet (see DEFERRED_SPRITES) are added by a later call
+        for sprite in fighter.sprites.values():
+            if 'image' in sprite:
+                self.add_sheet(sprite['image'], sprite['framesMax'])
+        self.add_variants(fighter.variants())
+
+    def add_variants(self, variants):
+        new = set(variants) - self.variants - {PLAIN}
+        self.variants |= new
+        for variant in new:
+            self.variant_pages[variant] = [apply_variant(page, variant) for page in self.pages]
+
+    def pack(self):
+        if not self.pending:
+            return
+        # Shelf packing, tallest frames first
+        self.pending.sort(key=lambda p: p[2].height, reverse=True)
+        page = None
+        x = y = shelf_height = 0
+        used = []
+        for key, frame, trim in self.pending:
+            w, h = trim.width + self.padding, trim.height + self.padding
+            if page is not None and x + w > self.page_size:
+                x, y, shelf_height = 0, y + shelf_height, 0
+            if page is None or y + h > self.page_size:
+                page = self._new_page()
+                used.append([0, 0])
+                x = y = shelf_height = 0
+
+            self.pages[page].blit(frame, (x, y), trim)
+            self.frames[key] = AtlasFrame(page, pygame.Rect(x, y, trim.width, trim.height),
+                                          trim.topleft, frame.get_size())
+            x += w
+            shelf_height = max(shelf_height, h)
+            used[-1][0] = max(used[-1][0], x)
+            used[-1][1] = max(used[-1][1], y + shelf_height)
+        self.pending = []
+        self.pending_keys.clear()
+
+        # Shrink freshly packed pages to the area actually used
+        first_new = len(self.pages) - len(used)
+        for i, (width, height) in enumerate(used):
+            self.pages[first_new + i] = self.pages[first_new + i].subsurface((0, 0, width, height)).copy()
+        if pygame.display.get_surface() is not None:
+            self.pages = [p.convert_alpha() for p in self.pages]
+        for variant in self.variants:
+            self.variant_pages[variant] = [apply_variant(page, variant) for page in self.pages]
+
+    def _new_page(self):
+        page = pygame.Surface((self.page_size, self.page_size), pygame.SRCALPHA)
+        page.fill((0, 0, 0, 0))
+        self.pages.append(page)
+        return len(self.pages) - 1
+
+    def get(self, image, frame_index, frame_width, variant=PLAIN):
+        frame = self.frames.get((image, frame_index, frame_width))
+        if frame is None or variant == PLAIN:
+            return frame
+        if variant not in self.variant_pages:
+            return None
+        if variant[0]:
+            page_width = self.pages[frame.page].get_width()
+            rect = frame.rect.copy()
+            rect.x = page_width - frame.rect.right
+            trim = (frame.size[0] - frame.trim[0] - frame.rect.width, frame.trim[1])
+            frame = AtlasFrame(frame.page, rect, trim, frame.size)
+        return frame
+
+    def region(self, atlas_frame, variant=PLAIN):
+        pages = self.pages if variant == PLAIN else self.variant_pages[variant]
+        return pages[atlas_frame.page].subsurface(atlas_frame.rect)
+
+    def memory_bytes(self):
+        pages = self.pages + [page for pages in self.variant_pages.values() for page in pages]
+        return sum(p.get_pitch() * p.get_height() for p in pages)
+
+
+def build_atlas(fighters, page_size=2048):
+    atlas = TextureAtlas(page_size)
+    for fighter in fighters:
+        atlas.add_fighter(fighter)
+    atlas.pack()
+    return atlas
@@ -0,0 +1,241 @@
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+from controls import LEFT, RIGHT, PRESS_LEFT, PRESS_RIGHT, JUMP, ATTACK, TRANSFORM
+from simulation import TICK_RATE, new_match, step
+import ai
+
+# Headless balance runner: plays many matches across all cores and streams
+# one result row per match.
+#
+#   python batch.py --matches 10000 --damage 10 20 --transform-damage 5 10 --out results.jsonl
+
+RESULT_FIELDS = [
+    'match', 'seed', 'policy', 'enemy_policy', 'player_character', 'enemy_character',
+    'gravity', 'damage', 'transform_damage', 'transform_invincible', 'attack_box_width', 'attack_box_height',
+    'winner', 'ticks', 'seconds',
+    'player_hp', 'enemy_hp', 'player_hits', 'enemy_hits', 'player_transforms', 'enemy_transforms',
+    'search_ms',
+]
+
+
+# Mashes buttons and holds a random direction for a random number of ticks
+class RandomPolicy:
+    def __init__(self, rng):
+        self.rng = rng
+        self.direction = 0
+        self.hold_ticks = 0
+
+    def __call__(self, state, index):
+        bits = 0
+        if self.hold_ticks <= 0:
+            self.direction = self.rng.choice((0, LEFT, RIGHT))
+            self.hold_ticks = self.rng.randint(5, 40)
+            if self.direction == LEFT:
+                bits |= PRESS_LEFT
+            elif self.direction == RIGHT:
+                bits |= PRESS_RIGHT
+        self.hold_ticks -= 1
+        bits |= self.direction
+
+        roll = self.rng.random()
+        if roll < 0.02:
+            bits |= JUMP
+        elif roll < 0.07:
+            bits |= ATTACK
+        elif roll < 0.073:
+            bits |= TRANSFORM
+        return bits
+
+
+# Walks toward the opponent and attacks once in range
+class ChasePolicy:
+    def __init__(self, rng, attack_range=200):
+        self.rng = rng
+        self.attack_range = attack_range
+        self.direction = 0
+
+    def __call__(self, state, index):
+        me = state.fighters[index]
+        other = state.fighters[1 - index]
+        dx = other.position.x - me.position.x
+
+        bits = 0
+        if abs(dx) <= self.attack_range:
+            direction = 0
+            if self.rng.random() < 0.2:
+                bits |= ATTACK
+        else:
+            direction = RIGHT if dx > 0 else LEFT
+
+        if direction != self.direction:
+            if direction == LEFT:
+                bits |= PRESS_LEFT
+            elif direction == RIGHT:
+                bits |= PRESS_RIGHT
+            self.direction = direction
+        bits |= direction
+
+        if self.rng.random() < 0.005:
+            bits |= TRANSFORM
+        return bits
+
+
+POLICIES = {
+    'random': RandomPolicy,
+    'chase': ChasePolicy,
+}
+POLICIES.update(ai.POLICIES)
+
+
+def apply_overrides(state, params):
+    state.gravity = params['gravity']
+    for fighter in state.fighters:
+        if params['damage'] is not None:
+            fighter.base_damage = params['damage']
+            fighter.damage = params['damage']
+        if params['transform_damage'] is not None:
+            fighter.transform_damage = params['transform_damage']
+        if params['transform_invincible'] is not None:
+            fighter.transform_invincible = params['transform_invincible']
+        width, height = fighter.attack_box_size
+        if params['attack_box_width'] is not None:
+            width = params['attack_box_width']
+        if params['attack_box_height'] is not None:
+            height = params['attack_box_height']
+        fighter.attack_box_size = (width, height)
+
+
+def run_match(job):
+    match_id, seed, params = job
+    rng = random.Random(seed)
+    policies = (POLICIES[params['policy']](rng), POLICIES[params['enemy_policy'] or params['policy']](rng))
+
+    state = new_match(params['player_character'], params['enemy_character'])
+    apply_overrides(state, params)
+    while not state.game_over:
+        step(state, (policies[0](state, 0), policies[1](state, 1)))
+
+    player, enemy = state.fighters
+    result = {'match': match_id, 'seed': seed}
+    result.update(params)
+    result.update({
+        'winner': state.winner,
+        'ticks': state.tick,
+        'seconds': state.tick / TICK_RATE,
+        'player_hp': player.health_comp.current_hp,
+        'enemy_hp': enemy.health_comp.current_hp,
+        'player_hits': state.hits[0],
+        'enemy_hits': state.hits[1],
+        'player_transforms': player.transform_count,
+        'enemy_transforms': enemy.transform_count,
+        'search_ms': None,
+    })
+    # Slowest lookahead search, to check the policies fit in a frame
+    searched = [policy for policy in policies if getattr(policy, 'searches', 0)]
+    if searched:
+        result['search_ms'] = round(max(policy.slowest_search for policy in searched) * 1000, 3)
+    return result
+
+
+def build_jobs(args):
+    sweep = itertools.product(
+        args.gravity, args.damage, args.transform_damage, args.transform_invincible,
+        args.attack_box_width, args.attack_box_height,
+    )
+    match_id = 0
+    for gravity, damage, transform_damage, invincible, box_width, box_height in sweep:
+        params = {
+            'policy': args.policy,
+            'enemy_policy': args.enemy_policy,
+            'player_character': args.player_character,
+            'enemy_character': args.enemy_character,
+            'gravity': gravity,
+            'damage': damage,
+            'transform_damage': transform_damage,
+            'transform_invincible': invincible,
+            'attack_box_width': box_width,
+            'attack_box_height': box_height,
+        }
+        for _ in range(args.matches):
+            yield match_id, args.seed + match_id, params
+            match_id += 1
+
+
+class ResultWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='') if path != '-' else sys.stdout
+        self.csv = None
+        if path.endswith('.csv'):
+            self.csv = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, result):
+        if self.csv:
+            self.csv.writerow(result)
+        else:
+            self.file.write(json.dumps(result) + '\n')
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run headless matches across a process pool.")
+    parser.add_argument('--matches', type=int, default=100, help="matches per parameter combination")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--enemy-policy', choices=sorted(POLICIES), help="policy for the enemy (default: same as --policy)")
+    parser.add_argument('--player-character', default='samuraiMack')
+    parser.add_argument('--enemy-character', default='kenji')
+    parser.add_argument('--out', default='results.jsonl', help="output file (.jsonl or .csv, '-' for stdout)")
+    # Every override takes one or more values; the runner plays the full cross product
+    parser.add_argument('--gravity', type=float, nargs='+', default=[1.5])
+    parser.add_argument('--damage', type=int, nargs='+', default=[None])
+    parser.add_argument('--transform-damage', type=int, nargs='+', default=[None])
+    parser.add_argument('--transform-invincible', type=int, choices=(0, 1), nargs='+', default=[None])
+    parser.add_argument('--attack-box-width', type=int, nargs='+', default=[None])
+    parser.add_argument('--attack-box-height', type=int, nargs='+', default=[None])
+    args = parser.parse_args(argv)
+    args.transform_invincible = [None if v is None else bool(v) for v in args.transform_invincible]
+    return args
+
+
+# Plays every job across the pool, yielding results as they finish. Each
+# worker plays one match at a time with the object simulation, since the
+# policies read Fighter objects. bulk.BulkMatches only fits inputs that
+# can be computed for every match at once.
+def run_batch(args):
+    with multiprocessing.Pool(args.workers) as pool:
+        yield from pool.imap_unordered(run_match, build_jobs(args), chunksize=16)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    writer = ResultWriter(args.out)
+    started = time.perf_counter()
+    count = 0
+    try:
+        for result in run_batch(args):
+            writer.write(result)
+            count += 1
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{count} matches in {elapsed:.1f}s ({count / elapsed:.1f} matches/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
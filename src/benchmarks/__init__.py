@@ -0,0 +1,7 @@
+# Headless benchmarks for the draw, update and collision hot paths.
+#
+#   cd src && python -m benchmarks                       # run everything
+#   python -m benchmarks -k draw --out results.json      # some of them
+#   python -m benchmarks --update-baseline               # store this machine's numbers
+#   python -m benchmarks --baseline benchmarks/baseline.json --threshold 0.1
+from benchmarks.runner import BENCHMARKS, benchmark, measure, run, compare
@@ -0,0 +1,50 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import sys
+
+from benchmarks import cases  # noqa: F401 (registers the benchmarks)
+from benchmarks.runner import BENCHMARKS, run, compare, save, load
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Headless performance benchmarks.")
+    parser.add_argument('-k', metavar='REGEX', help="only run benchmarks whose name matches")
+    parser.add_argument('--list', action='store_true', help="list the benchmarks and exit")
+    parser.add_argument('--min-time', type=float, default=0.5, help="seconds to run each micro benchmark")
+    parser.add_argument('--out', metavar='PATH', help="write the results as JSON")
+    parser.add_argument('--baseline', metavar='PATH', nargs='?', const=DEFAULT_BASELINE,
+                        help="compare with stored results (default: benchmarks/baseline.json)")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="fail when ops/s drops by more than this fraction of the baseline")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the baseline")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (group, _) in BENCHMARKS.items():
+            print(f"{name:<28} {group}")
+        return 0
+
+    # Cases load assets relative to src/, like the game
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    results = run(args.k, args.min_time)
+
+    regressions = []
+    if args.baseline:
+        regressions = compare(results, load(args.baseline), args.threshold)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.1f} -> {new:.1f} ops/s ({change:+.1%})")
+    if args.out:
+        save(results, args.out)
+    if args.update_baseline:
+        save(results, DEFAULT_BASELINE)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+import os
+import random
+import pygame
+
+from benchmarks.runner import benchmark
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+IMG = os.path.join(ROOT, 'assets', 'img')
+
+_screen = None
+
+
+def screen():
+    # Everything draws to the (dummy) display surface, like the game does,
+    # so images get converted the same way
+    global _screen
+    if _screen is None:
+        from simulation import WIDTH, HEIGHT
+        pygame.init()
+        _screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    return _screen
+
+
+def fighters():
+    screen()
+    from frame_cache import frame_cache
+    from atlas import build_atlas
+    from roster import create_fighters
+    from simulation import WIDTH
+    player, enemy = create_fighters()
+    enemy.health_bar.rect.x = WIDTH - enemy.health_bar.rect.width - 20
+    frame_cache.atlas = build_atlas((player, enemy))
+    return player, enemy
+
+
+def font():
+    screen()
+    return pygame.font.SysFont("Arial", 36)
+
+
+# --- Micro ---
+
+@benchmark('sprite_draw')
+def sprite_draw():
+    from classes import Sprite
+    surface = screen()
+    shop = Sprite((600, 128), os.path.join(IMG, 'shop.png'), scale=2.75, frames_max=6)
+
+    def run():
+        shop.draw(surface)
+        shop.animate_frames()
+    return run
+
+
+def _fighter_draw(transformed, facing=1):
+    from simulation import GRAVITY, STAGE
+    surface = screen()
+    player, _ = fighters()
+    player.simulate(GRAVITY, STAGE)
+    if transformed:
+        player.transform()
+    player.facing = facing
+
+    def run():
+        player.draw(surface)
+        player.animate_frames()
+    return run
+
+
+@benchmark('fighter_draw_2.5')
+def fighter_draw_base():
+    return _fighter_draw(False)
+
+
+@benchmark('fighter_draw_3.0')
+def fighter_draw_transformed():
+    return _fighter_draw(True)
+
+
+@benchmark('fighter_draw_flipped')
+def fighter_draw_flipped():
+    # Mirrored frames come from the atlas' flipped pages, so this should
+    # cost the same as fighter_draw_2.5
+    return _fighter_draw(False, facing=-1)
+
+
+@benchmark('fighter_update')
+def fighter_update():
+    from simulation import WIDTH, HEIGHT, GRAVITY
+    surface = screen()
+    player, _ = fighters()
+
+    def run():
+        player.update(surface, GRAVITY, HEIGHT, WIDTH)
+    return run
+
+
+@benchmark('switch_sprite')
+def switch_sprite():
+    player, _ = fighters()
+    names = ('idle', 'run')
+    flip = [0]
+
+    def run():
+        flip[0] ^= 1
+        player.switch_sprite(names[flip[0]])
+    return run
+
+
+@benchmark('rectangular_collision')
+def rectangular_collision():
+    from utils import rectangular_collision as collide
+    player, enemy = fighters()
+
+    def run():
+        collide(player, enemy)
+    return run
+
+
+@benchmark('find_hits')
+def find_hits():
+    from collision import find_hits as hits
+    player, enemy = fighters()
+    player.attack()
+    player.frames_current = player.hit_frame
+    fighter_pair = (player, enemy)
+
+    def run():
+        hits(fighter_pair)
+    return run
+
+
+@benchmark('health_bar_draw')
+def health_bar_draw():
+    surface = screen()
+    player, _ = fighters()
+    player.health_comp.current_hp = 60
+
+    def run():
+        player.health_bar.draw(surface)
+    return run
+
+
+@benchmark('update_timer')
+def update_timer():
+    from utils import update_timer as draw_timer
+    surface = screen()
+    timer_font = font()
+    seconds = [60]
+
+    def run():
+        seconds[0] = seconds[0] - 1 if seconds[0] else 60
+        draw_timer(surface, timer_font, seconds[0])
+    return run
+
+
+@benchmark('bodies_integrate_500')
+def bodies_integrate():
+    # Effects-sized pool: one pass over 500 falling bodies
+    from physics import Bodies
+    from simulation import GRAVITY, STAGE
+    rng = random.Random(1)
+    bodies = Bodies(STAGE, capacity=500)
+    for _ in range(500):
+        bodies.add(rng.uniform(0, 950), rng.uniform(0, 400), rng.uniform(-5, 5), rng.uniform(-30, 0), height=8)
+
+    def run():
+        bodies.integrate(GRAVITY)
+    return run
+
+
+@benchmark('effects_500')
+def effects_frame():
+    # A tick and a frame of a full particle pool
+    from effects import Effects, AURA
+    from simulation import WIDTH, HEIGHT
+    surface = screen()
+    effects = Effects((WIDTH, HEIGHT), HEIGHT - 96, capacity=500, seed=1)
+
+    def run():
+        while len(effects) < 480:
+            effects.burst(AURA, 300, 300, 300, 100)
+        effects.advance()
+        effects.draw(surface)
+    return run
+
+
+def _mid_match(ticks=300):
+    from simulation import new_match, step
+    screen()
+    state = new_match()
+    for bits in _scripted_inputs()[:ticks]:
+        step(state, bits)
+    return state
+
+
+@benchmark('utility_policy')
+def utility_policy():
+    from ai import UtilityPolicy
+    state = _mid_match()
+    policy = UtilityPolicy(random.Random(1))
+
+    def run():
+        policy(state, 1)
+    return run
+
+
+@benchmark('lookahead_search')
+def lookahead_search():
+    # One full search (every action, no step limit); the policy runs one
+    # every `interval` ticks
+    from ai import LookaheadPolicy
+    state = _mid_match()
+    policy = LookaheadPolicy(random.Random(1), max_steps=None)
+
+    def run():
+        policy.search(state, 1)
+    return run
+
+
+@benchmark('arena_tick')
+def arena_tick():
+    # One server.py arena tick, CPU vs CPU with the state broadcast to
+    # nobody; server.py sizes its workers from this
+    from server import Arena
+    screen()
+    arena = Arena(0, cpu='utility', seed=1, demo=True)
+
+    def run():
+        arena.tick()
+    return run
+
+
+# --- Macro ---
+
+def _scripted_inputs(seed=1):
+    # The same 60 seconds of ChasePolicy inputs every run
+    from batch import ChasePolicy
+    from simulation import ROUND_TICKS, new_match, step
+    rng = random.Random(seed)
+    policies = (ChasePolicy(rng), ChasePolicy(rng))
+    state = new_match()
+    inputs = []
+    for _ in range(ROUND_TICKS):
+        bits = tuple(policy(state, index) for index, policy in enumerate(policies))
+        inputs.append(bits)
+        step(state, bits)
+    return inputs
+
+
+@benchmark('match_60s_simulation', group='macro')
+def match_simulation():
+    from simulation import new_match, step
+    screen()
+    inputs = _scripted_inputs()
+
+    def run():
+        state = new_match()
+        for bits in inputs:
+            step(state, bits)
+    return run
+
+
+@benchmark('match_60s_rendered', group='macro')
+def match_rendered():
+    from classes import Sprite
+    from compositor import LayerCompositor
+    from simulation import WIDTH, HEIGHT, new_match, step, remaining_seconds
+    from utils import update_timer as draw_timer
+    surface = screen()
+    timer_font = font()
+    fighters()
+    background = Sprite((0, 0), os.path.join(IMG, 'background.png'))
+    shop = Sprite((600, 128), os.path.join(IMG, 'shop.png'), scale=2.75, frames_max=6)
+    scene = LayerCompositor((WIDTH, HEIGHT), background, animated=[shop])
+    inputs = _scripted_inputs()
+
+    def run():
+        state = new_match()
+        state.enemy.health_bar.rect.x = WIDTH - state.enemy.health_bar.rect.width - 20
+        for bits in inputs:
+            step(state, bits)
+            scene.advance()
+            scene.draw(surface)
+            state.player.draw(surface)
+            state.enemy.draw(surface)
+            draw_timer(surface, timer_font, remaining_seconds(state))
+            state.player.health_bar.draw(surface)
+            state.enemy.health_bar.draw(surface)
+    return run
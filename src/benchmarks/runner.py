@@ -0,0 +1,142 @@
+import gc
+import json
+import os
+import platform
+import re
+import time
+import tracemalloc
+
+# name -> (group, setup). setup() builds whatever the case needs and returns
+# the function being measured, which takes no arguments.
+BENCHMARKS = {}
+
+
+def benchmark(name, group='micro'):
+    def register(setup):
+        BENCHMARKS[name] = (group, setup)
+        return setup
+    return register
+
+
+def percentiles(values, qs=(50, 90, 99)):
+    # Same nearest-rank percentiles as profiler.FrameProfiler
+    values = sorted(values)
+    return {q: values[min(len(values) - 1, len(values) * q // 100)] for q in qs}
+
+
+def _calibrate(fn, batch_time):
+    # Calls per sample, so that fast cases aren't all timer overhead
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        if time.perf_counter() - started >= batch_time or calls >= 1 << 20:
+            return calls
+        calls *= 2
+
+
+def _allocations(fn, calls):
+    # Blocks and bytes allocated per call that are still alive afterwards,
+    # plus the peak traced memory while running
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        for _ in range(calls):
+            fn()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    size = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    return blocks / calls, size / calls, peak
+
+
+def measure(fn, min_time=0.5, batch_time=0.002, alloc_calls=None, min_samples=5):
+    calls = _calibrate(fn, batch_time)
+    samples = []
+    total_calls = 0
+    gc.collect()
+    started = time.perf_counter()
+    while True:
+        batch_start = time.perf_counter_ns()
+        for _ in range(calls):
+            fn()
+        samples.append((time.perf_counter_ns() - batch_start) / calls)
+        total_calls += calls
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time and len(samples) >= min_samples:
+            break
+
+    blocks, size, peak = _allocations(fn, alloc_calls or min(calls, 1000))
+    spread = percentiles(samples)
+    return {
+        'ops_per_sec': round(total_calls / elapsed, 1),
+        'mean_us': round(elapsed / total_calls * 1e6, 3),
+        'p50_us': round(spread[50] / 1000, 3),
+        'p90_us': round(spread[90] / 1000, 3),
+        'p99_us': round(spread[99] / 1000, 3),
+        'samples': len(samples),
+        'allocs_per_op': round(blocks, 2),
+        'alloc_bytes_per_op': round(size, 1),
+        'peak_bytes': peak,
+    }
+
+
+def run(pattern=None, min_time=0.5, log=print):
+    results = {}
+    for name, (group, setup) in BENCHMARKS.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        fn = setup()
+        # Macro cases are long; a couple of runs is enough
+        if group == 'macro':
+            result = measure(fn, min_time=0, batch_time=0, alloc_calls=1, min_samples=3)
+        else:
+            result = measure(fn, min_time)
+        result['group'] = group
+        results[name] = result
+        if log:
+            log(f"{name:<28} {result['ops_per_sec']:>12.1f} ops/s  p50 {result['p50_us']:>10.2f} us  "
+                f"p99 {result['p99_us']:>10.2f} us  {result['allocs_per_op']:>6.2f} allocs/op")
+    return {'meta': machine_info(), 'results': results}
+
+
+def machine_info():
+    import pygame
+    return {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+# Benchmarks whose ops/s dropped by more than threshold (0.1 = 10%)
+def compare(results, baseline, threshold=0.1):
+    regressions = []
+    for name, result in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        change = result['ops_per_sec'] / old['ops_per_sec'] - 1
+        result['change'] = round(change, 4)
+        if change < -threshold:
+            regressions.append((name, old['ops_per_sec'], result['ops_per_sec'], change))
+    return regressions
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,330 @@
+import numpy as np
+
+from animation import (ANIMATIONS, IDLE, RUN, JUMP_ANIM, FALL, ATTACK1, TAKE_HIT, DEATH, SWITCH, DIE, HIT,
+                       AnimationStates)
+from assets import assets
+from classes import TRANSFORM_TICKS
+from controls import LEFT, RIGHT, PRESS_LEFT, PRESS_RIGHT, JUMP, ATTACK, TRANSFORM
+from roster import get_roster
+from physics import integrate
+from simulation import TICK_RATE, ROUND_TICKS, STAGE, GRAVITY, RUN_SPEED, JUMP_VELOCITY
+
+# Many headless matches stepped together. All mutable state lives in two
+# float64 buffers laid out struct-of-arrays (one row per field, one column
+# per fighter / match), and each tick runs the same rules as
+# simulation.step as a handful of whole-array systems. A match is
+# FIGHTER_FIELDS * 2 + MATCH_FIELDS numbers, so snapshot() is a single copy.
+#
+# Per-frame hitbox/hurtbox data from the roster is not supported here; the
+# bulk rules use the default attack box (on "hit" frame events) vs
+# whole-frame hurtbox, both mirrored when a fighter has turned around.
+
+(POS_X, POS_Y, VEL_X, VEL_Y, ATK_X, ATK_Y, HP, JUMPS, ANIM, FRAME, ELAPSED,
+ ATTACKING, DEAD, T_ACTIVE, T_TICKS, T_COUNT, SCALE, DAMAGE, INVINCIBLE,
+ LAST_KEY, HITS, CHAR, BASE_DAMAGE, T_DAMAGE, T_INVINCIBLE, FACING) = range(26)
+FIGHTER_FIELDS = 26
+
+TICK, GAME_OVER, GAME_OVER_TICK, WINNER, GRAVITY_FIELD = range(5)
+MATCH_FIELDS = 5
+
+# WINNER values
+NO_WINNER, TIE, PLAYER_WINS, ENEMY_WINS = range(4)
+WINNER_TEXT = {TIE: "Tie", PLAYER_WINS: "Player 1 Wins", ENEMY_WINS: "Player 2 Wins"}
+
+FRAMES_HOLD = 5
+MAX_JUMPS = 2
+MAX_HP = 100
+BASE_SCALE = 2.5
+TRANSFORM_SCALE = 3.0
+START_POSITIONS = ((0, 0), (400, 100))
+
+
+# Per-character lookup tables, indexed [character, animation]
+class CharacterTables:
+    def __init__(self, names):
+        roster = get_roster()
+        self.names = list(names)
+        n = len(self.names)
+        shape = (n, len(ANIMATIONS))
+        self.frames_max = np.zeros(shape)
+        self.sprite_w = np.zeros(shape)
+        self.sprite_h = np.zeros(shape)
+        # animation.AnimationStates tables: [character, finished, current, target]
+        self.transitions = np.zeros((n, 2) + (len(ANIMATIONS),) * 2, dtype=np.int8)
+        self.lock_end = np.zeros(shape)
+        # [character, animation, frame] is a hit frame; last one per animation (-1: none)
+        frames = max(sprite['framesMax'] for name in self.names for sprite in roster[name]['sprites'].values())
+        self.hit_event = np.zeros(shape + (frames,), dtype=bool)
+        self.last_hit = np.full(shape, -1.0)
+        self.atk_off_x = np.zeros(n)
+        self.atk_off_y = np.zeros(n)
+        self.atk_w = np.zeros(n)
+        self.atk_h = np.zeros(n)
+        self.base_damage = np.zeros(n)
+        # Which way the sheets face, and the x (relative to position) that
+        # boxes are mirrored around when facing the other way
+        self.sheet_facing = np.ones(n)
+        self.axis = np.zeros(n)
+
+        for c, name in enumerate(self.names):
+            character = roster[name]
+            states = AnimationStates(character['sprites'], character['events'])
+            a = len(ANIMATIONS)
+            for finished in (0, 1):
+                self.transitions[c, finished] = [row[:a] for row in states.transitions[finished][:a]]
+            self.lock_end[c] = states.lock_end[:a]
+            for a, anim in enumerate(ANIMATIONS):
+                sprite = character['sprites'].get(anim)
+                if sprite is None:
+                    continue
+                width, height = assets.size(sprite['imageSrc'])
+                self.frames_max[c, a] = sprite['framesMax']
+                self.sprite_w[c, a] = width // sprite['framesMax']
+                self.sprite_h[c, a] = height
+                for frame, event in enumerate(states.events[a]):
+                    self.hit_event[c, a, frame] = event == HIT
+                self.last_hit[c, a] = states.last_event[a].get(HIT, -1)
+            box = character['attack_box']
+            self.atk_off_x[c], self.atk_off_y[c] = box['offset']
+            self.atk_w[c] = box['width']
+            self.atk_h[c] = box['height']
+            self.base_damage[c] = character['profiles']['base']['damage']
+            self.sheet_facing[c] = character['facing']
+            idle_w = assets.size(character['sprites']['idle']['imageSrc'])[0] // character['sprites']['idle']['framesMax']
+            self.axis[c] = idle_w * character['scale'] / 2 - character['offset'][0]
+
+
+class BulkMatches:
+    def __init__(self, count, player_character='samuraiMack', enemy_character='kenji', stage=STAGE,
+                 turn_around=True):
+        self.count = count
+        self.stage = stage
+        self.turn_around = turn_around
+        self.tables = CharacterTables(sorted({player_character, enemy_character}))
+        # Fighter columns: players are [0, count), enemies are [count, 2 * count)
+        self.fighters = np.zeros((FIGHTER_FIELDS, 2 * count))
+        self.matches = np.zeros((MATCH_FIELDS, count))
+        self.player = slice(0, count)
+        self.enemy = slice(count, 2 * count)
+
+        f = self.fighters
+        f[CHAR, self.player] = self.tables.names.index(player_character)
+        f[CHAR, self.enemy] = self.tables.names.index(enemy_character)
+        for side, (x, y) in zip((self.player, self.enemy), START_POSITIONS):
+            f[POS_X, side] = x
+            f[POS_Y, side] = y
+        char = self.char()
+        f[ATK_X] = f[POS_X] + self.tables.atk_off_x[char]
+        f[ATK_Y] = f[POS_Y] + self.tables.atk_off_y[char]
+        f[HP] = MAX_HP
+        f[JUMPS] = MAX_JUMPS
+        f[ANIM] = IDLE
+        f[SCALE] = BASE_SCALE
+        f[BASE_DAMAGE] = self.tables.base_damage[char]
+        f[DAMAGE] = f[BASE_DAMAGE]
+        f[T_DAMAGE] = 10
+        f[T_INVINCIBLE] = 1
+        f[FACING] = self.tables.sheet_facing[char]
+        self.matches[GRAVITY_FIELD] = GRAVITY
+        self.matches[GAME_OVER_TICK] = -1
+
+    # --- lookups ---
+
+    def char(self):
+        return self.fighters[CHAR].astype(np.intp)
+
+    def anim_table(self, table, anim=None):
+        anim = self.fighters[ANIM].astype(np.intp) if anim is None else anim
+        return table[self.char(), anim]
+
+    # --- snapshots ---
+
+    def snapshot(self):
+        return self.fighters.copy(), self.matches.copy()
+
+    def restore(self, snapshot):
+        np.copyto(self.fighters, snapshot[0])
+        np.copyto(self.matches, snapshot[1])
+
+    # --- animation system ---
+
+    def switch_sprite(self, mask, anim):
+        # Vectorized Fighter.switch_animation for every fighter in mask
+        f = self.fighters
+        char = self.char()
+        current = f[ANIM].astype(np.intp)
+        finished = (f[FRAME] >= self.tables.lock_end[char, current]).astype(np.intp)
+        action = self.tables.transitions[char, finished, current, anim]
+
+        f[DEAD, mask & (action == DIE)] = 1
+        switch = mask & (action == SWITCH)
+        f[ANIM, switch] = anim
+        f[FRAME, switch] = 0
+
+    def animate(self):
+        f = self.fighters
+        alive = f[DEAD] == 0
+        f[ELAPSED, alive] += 1
+        advance = alive & (f[ELAPSED] % FRAMES_HOLD == 0)
+        last_frame = self.anim_table(self.tables.frames_max) - 1
+        f[FRAME] = np.where(advance, np.where(f[FRAME] < last_frame, f[FRAME] + 1, 0), f[FRAME])
+
+    # --- physics system ---
+
+    def physics(self):
+        f = self.fighters
+        char = self.char()
+        f[ATK_X] = f[POS_X] + self.tables.atk_off_x[char]
+        f[ATK_Y] = f[POS_Y] + self.tables.atk_off_y[char]
+        sprite_h = self.anim_table(self.tables.sprite_h)
+        height = np.where(f[T_ACTIVE] == 1, sprite_h * f[SCALE], sprite_h)
+        gravity = np.tile(self.matches[GRAVITY_FIELD], 2)
+        integrate(f[POS_X], f[POS_Y], f[VEL_X], f[VEL_Y], height, f[JUMPS], MAX_JUMPS, gravity, self.stage)
+
+    def transform_timers(self):
+        f = self.fighters
+        active = f[T_ACTIVE] == 1
+        f[T_TICKS, active] -= 1
+        revert = active & (f[T_TICKS] <= 0)
+        f[SCALE, revert] = BASE_SCALE
+        f[DAMAGE, revert] = f[BASE_DAMAGE, revert]
+        f[T_ACTIVE, revert] = 0
+        f[POS_Y, revert] = self.stage.floor - self.anim_table(self.tables.sprite_h)[revert] * BASE_SCALE
+        f[INVINCIBLE, revert] = 0
+
+    # --- input and health systems ---
+
+    def apply_input(self, bits):
+        f = self.fighters
+        alive = f[DEAD] == 0
+        press_left = alive & (bits & PRESS_LEFT != 0)
+        press_right = alive & ~press_left & (bits & PRESS_RIGHT != 0)
+        f[LAST_KEY, press_left] = LEFT
+        f[LAST_KEY, press_right] = RIGHT
+
+        jump = alive & (bits & JUMP != 0) & (f[JUMPS] > 0)
+        f[VEL_Y, jump] = JUMP_VELOCITY
+        f[JUMPS, jump] -= 1
+
+        attack = alive & (bits & ATTACK != 0)
+        self.switch_sprite(attack, ATTACK1)
+        f[ATTACKING, attack] = 1
+
+        transform = alive & (bits & TRANSFORM != 0) & (f[T_COUNT] < 2) & (f[T_ACTIVE] == 0)
+        f[SCALE, transform] = TRANSFORM_SCALE
+        f[T_ACTIVE, transform] = 1
+        f[T_TICKS, transform] = TRANSFORM_TICKS
+        f[T_COUNT, transform] += 1
+        f[INVINCIBLE, transform] = f[T_INVINCIBLE, transform]
+        f[DAMAGE, transform] = f[T_DAMAGE, transform]
+
+    def movement(self, bits):
+        f = self.fighters
+        f[VEL_X] = 0
+        alive = f[DEAD] == 0
+        left = alive & (bits & LEFT != 0) & (f[LAST_KEY] == LEFT)
+        right = alive & ~left & (bits & RIGHT != 0) & (f[LAST_KEY] == RIGHT)
+        f[VEL_X, left] = -RUN_SPEED
+        f[VEL_X, right] = RUN_SPEED
+        self.switch_sprite(left | right, RUN)
+        self.switch_sprite(alive & ~left & ~right, IDLE)
+        self.switch_sprite(alive & (f[VEL_Y] < 0), JUMP_ANIM)
+        self.switch_sprite(alive & (f[VEL_Y] > 0), FALL)
+
+    def facing(self):
+        # Face the opponent unless dead or mid-swing, like simulation.update_facing
+        f = self.fighters
+        center = f[POS_X] + self.tables.axis[self.char()]
+        other = np.concatenate([center[self.enemy], center[self.player]])
+        turn = (f[DEAD] == 0) & (f[ATTACKING] == 0) & (other != center)
+        f[FACING] = np.where(turn, np.sign(other - center), f[FACING])
+
+    def flipped(self):
+        return self.fighters[FACING] != self.tables.sheet_facing[self.char()]
+
+    def take_hit(self, mask, damage):
+        f = self.fighters
+        hurt = mask & (f[INVINCIBLE] == 0)
+        f[HP] = np.where(hurt, np.maximum(0, f[HP] - damage), f[HP])
+        self.switch_sprite(mask & (f[HP] <= 0), DEATH)
+        self.switch_sprite(mask & (f[HP] > 0), TAKE_HIT)
+
+    def attacks(self):
+        f = self.fighters
+        t = self.tables
+        char = self.char()
+        landed = np.zeros(2 * self.count, dtype=bool)
+        flipped = self.flipped()
+
+        # Players swing first; a hit can knock the enemy out of its hit frame
+        for attacker, target in ((self.player, self.enemy), (self.enemy, self.player)):
+            on_hit_frame = t.hit_event[char, f[ANIM].astype(np.intp), f[FRAME].astype(np.intp)]
+            active = (f[ATTACKING, attacker] == 1) & on_hit_frame[attacker]
+            ac = char[attacker]
+            ax, ay = f[ATK_X, attacker], f[ATK_Y, attacker]
+            aw, ah = t.atk_w[ac], t.atk_h[ac]
+            # Mirrored boxes: x -> 2 * axis - x - width, relative to position
+            off = t.atk_off_x[ac]
+            ax = ax - off + np.where(flipped[attacker], 2 * t.axis[ac] - off - aw, off)
+            tx, ty = f[POS_X, target], f[POS_Y, target]
+            tw = self.anim_table(t.sprite_w)[target]
+            th = self.anim_table(t.sprite_h)[target]
+            tx = np.where(flipped[target], tx + 2 * t.axis[char[target]] - tw, tx)
+            hit = active & (ax + aw >= tx) & (ax <= tx + tw) & (ay + ah >= ty) & (ay <= ty + th)
+
+            mask = np.zeros(2 * self.count, dtype=bool)
+            mask[target] = hit
+            damage = np.zeros(2 * self.count)
+            damage[target] = f[DAMAGE, attacker]
+            self.take_hit(mask, damage)
+            f[HITS, attacker] += hit
+            landed[attacker] |= hit
+
+        last_hit = self.anim_table(t.last_hit)
+        finished = (f[ATTACKING] == 1) & (landed | (last_hit < 0) | (f[FRAME] >= last_hit))
+        f[ATTACKING, finished] = 0
+
+    # --- match rules ---
+
+    def deaths(self):
+        f = self.fighters
+        enemy_dies = (f[HP, self.enemy] <= 0) & (f[DEAD, self.enemy] == 0)
+        player_dies = ~enemy_dies & (f[HP, self.player] <= 0) & (f[DEAD, self.player] == 0)
+        self.switch_sprite(np.concatenate([np.zeros(self.count, dtype=bool), enemy_dies]), DEATH)
+        self.switch_sprite(np.concatenate([player_dies, np.zeros(self.count, dtype=bool)]), DEATH)
+
+    def end_matches(self, mask):
+        m = self.matches
+        p_hp = self.fighters[HP, self.player]
+        e_hp = self.fighters[HP, self.enemy]
+        m[GAME_OVER, mask] = 1
+        m[GAME_OVER_TICK, mask] = m[TICK, mask]
+        m[WINNER, mask] = np.where(p_hp == e_hp, TIE, np.where(p_hp > e_hp, PLAYER_WINS, ENEMY_WINS))[mask]
+
+    # inputs: (count, 2) array of controls bitmasks, one row per match
+    def step(self, inputs):
+        bits = np.asarray(inputs, dtype=np.int64).T.reshape(-1)
+        self.matches[TICK] += 1
+
+        self.apply_input(bits)
+        self.animate()
+        self.physics()
+        self.transform_timers()
+        self.movement(bits)
+        if self.turn_around:
+            self.facing()
+        self.attacks()
+        self.deaths()
+
+        f = self.fighters
+        ko = (f[HP, self.player] <= 0) | (f[HP, self.enemy] <= 0)
+        self.end_matches(ko & (self.matches[GAME_OVER] == 0))
+        timed_out = (ROUND_TICKS - self.matches[TICK]) // TICK_RATE <= 0
+        self.end_matches(timed_out & (self.matches[GAME_OVER] == 0))
+
+    @property
+    def done(self):
+        return bool(np.all(self.matches[GAME_OVER] == 1))
+
+    def winners(self):
+        return [WINNER_TEXT.get(int(w)) for w in self.matches[WINNER]]
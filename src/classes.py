@@ -1,6 +1,20 @@
 import pygame
 from abc import ABC, abstractmethod
+from collections import deque
 from health import HealthComponent, HealthBar
+from frame_cache import frame_cache
+from assets import assets
+from animation import AnimationStates, default_events, IDLE, ATTACK1, TAKE_HIT, DEATH, SWITCH, DIE, FLASH
+from variants import PLAIN
+from physics import Stage
+from effects import HIT_SPARKS, DUST, AURA, REVERT
+
+# Transformations last 5 seconds of simulation ticks (60 per second)
+TRANSFORM_TICKS = 300
+
+# Animations that are only loaded once they are needed (or once the
+# background decode finishes), so they don't hold up the first frame
+DEFERRED_SPRITES = ('death',)
 
 
 # Abstract base class
@@ -27,7 +41,8 @@ class Sprite(AbstractSprite):
         self.frames_elapsed = 0
         self.frames_hold = 5
         self.offset = pygame.Vector2(offset)
-        self.image = pygame.image.load(image_path).convert_alpha()
+        self.image_path = image_path
+        self.image = assets.load(image_path)
         self.sprite_width = self.image.get_width() // self.frames_max
         self.sprite_height = self.image.get_height()
         self.rect = pygame.Rect(self.position.x, self.position.y, self.sprite_width, self.sprite_height)
@@ -40,32 +55,30 @@ class Sprite(AbstractSprite):
     #     )
     #     surface.blit(scaled_image, (self.position.x - self.offset.x, self.position.y - self.offset.y))
     def draw(self, surface):
-        # pick the right subframe
-        frame_rect = pygame.Rect(
-            self.frames_current * self.sprite_width,
-            0,
-            self.sprite_width,
-            self.sprite_height
-        )
+        # pick the right subframe, already sliced and scaled
+        scaled_image, (trim_x, trim_y) = self.current_frame()
 
-        # scale the image
-        scaled_w = int(self.sprite_width * self.scale)
-        scaled_h = int(self.sprite_height * self.scale)
-        scaled_image = pygame.transform.scale(
-            self.image.subsurface(frame_rect),
-            (scaled_w, scaled_h)
-        )
+        # draw with the scaled offset
+        x, y = self.draw_position()
+        return surface.blit(scaled_image, (x + trim_x, y + trim_y))
 
+    def draw_position(self):
         # Scale the offset by the current sprite scale
-                # Invert the factor so offset shrinks when sprite grows
+        # Invert the factor so offset shrinks when sprite grows
         scale_factor = self.base_scale / self.scale
-        scaled_offset = self.offset * scale_factor
-
-        # draw with the scaled offset
-        surface.blit(
-            scaled_image,
-            (self.position.x - scaled_offset.x,
-            self.position.y - scaled_offset.y)
+        return (self.position.x - self.offset.x * scale_factor,
+                self.position.y - self.offset.y * scale_factor)
+
+    def current_frame(self, frame_index=None, variant=PLAIN):
+        if frame_index is None:
+            frame_index = self.frames_current
+        return frame_cache.get(
+            self.image,
+            frame_index,
+            self.sprite_width,
+            self.sprite_height,
+            self.scale,
+            variant
         )
 
     def animate_frames(self):
@@ -83,13 +96,32 @@ class Sprite(AbstractSprite):
 
 class Fighter(Sprite):
     def __init__(self, position, velocity, color='red', image_path=None, scale=1, frames_max=1, offset=(0, 0),
-                 sprites=None, attack_box=None, character_profiles=None):
+                 sprites=None, attack_box=None, character_profiles=None, name=None, hit_frame=4,
+                 hitboxes=None, hurtboxes=None, events=None, facing=1, tint=None):
         super().__init__(position, image_path, scale, frames_max, offset)
+        self.name = name
+        # attack1 frame on which the attack box deals damage
+        self.hit_frame = hit_frame
+        # Optional per-frame boxes: {animation: [boxes for each frame]}, see collision.py
+        self.hitboxes = hitboxes or {}
+        self.hurtboxes = hurtboxes or {}
+        self.animation = 'idle'
+        self.animation_id = IDLE
         self.velocity = pygame.Vector2(velocity)
+        # Where the last tick started, for drawing in between ticks
+        self.previous_position = pygame.Vector2(self.position)
         self.color = color
         self.attack_box_offset = pygame.Vector2(attack_box.get('offset', (0, 0)))
         self.attack_box_size = (attack_box.get('width', 0), attack_box.get('height', 0))
         self.attack_box_position = self.position + self.attack_box_offset
+        # 1 faces right, -1 left. The sheets (and box offsets) are drawn facing
+        # sheet_facing; facing the other way mirrors them around mirror_axis,
+        # the middle of the frame relative to position
+        self.sheet_facing = facing
+        self.facing = facing
+        self.mirror_axis = self.sprite_width * self.base_scale / 2 - self.offset.x
+        # Color multiplier for palette swaps (mirror matches), or None
+        self.tint = tint
         self.is_attacking = False
         #self.health = 100
         # Health logic separated into component and bar
@@ -97,9 +129,15 @@ class Fighter(Sprite):
         # Position the bar at top-left; tweak as desired
         self.health_bar  = HealthBar(self.health_comp, x=20, y=20, width=200, height=20)
         self.damage = 20
+        # Tunables for the transform combo (batch.py sweeps these)
+        self.base_damage = 20
+        self.transform_damage = 10
+        self.transform_invincible = True
         self.dead = False
         self.sprites = sprites or {}
         self.load_sprites()
+        # Animation ids, switch rules and frame events (see animation.py)
+        self.states = AnimationStates(self.sprites, default_events(hit_frame) if events is None else events)
 
         # --- Double Jump Support ---
         self.max_jumps = 2
@@ -109,11 +147,36 @@ class Fighter(Sprite):
         # --- New for transformation ---
         self.character_profiles = character_profiles or {}
         self.transform_active = False
-        self.transform_count = 0        
+        self.transform_count = 0
+        self.transform_ticks_left = 0
+
+        # Visual effect events (tick, kind) waiting for effects.Effects.collect();
+        # bounded so headless matches that never collect them don't grow it
+        self.effect_events = deque(maxlen=8)
+        self.effect_tick = 0
 
     def load_sprites(self):
+        # Surfaces are shared through the asset manager, so restarts don't touch the disk
         for key, sprite in self.sprites.items():
-            sprite['image'] = pygame.image.load(sprite['imageSrc']).convert_alpha()
+            if 'image' in sprite:
+                continue
+            if key in DEFERRED_SPRITES and not assets.is_ready([sprite['imageSrc']]):
+                continue
+            sprite['image'] = assets.load(sprite['imageSrc'])
+
+    def sprite_image(self, name):
+        sprite = self.sprites[name]
+        if 'image' not in sprite:
+            sprite['image'] = assets.load(sprite['imageSrc'])
+        return sprite['image']
+
+    # Gives back every surface this fighter loaded; call assets.purge() after
+    # to free the ones no other fighter uses
+    def release_assets(self):
+        assets.release(self.image_path)
+        for sprite in self.sprites.values():
+            if 'image' in sprite:
+                assets.release(sprite['imageSrc'])
 
     # def update(self, surface, gravity, screen_height):
     #     if not self.dead:
@@ -146,42 +209,89 @@ class Fighter(Sprite):
     #     self.draw(surface)
 
  
-    def update(self, surface, gravity, screen_height, screen_width):
+    def simulate(self, gravity, stage):
         if not self.dead:
             self.animate_frames()
 
-        self.screen_height = screen_height
+        self.stage = stage
 
+        self.previous_position.update(self.position)
         self.attack_box_position = self.position + self.attack_box_offset
         self.position += self.velocity
 
-        # 🧱 X-axis barrier to keep fighters on screen
-        self.position.x = max(0, min(self.position.x, 950))
-
-
-        # --- New Ground Collision Handling ---
-        if self.transform_active:
-            scaled_height = self.sprite_height * self.scale
-            if self.position.y + scaled_height >= screen_height - 40:
-                self.velocity.y = 0
-                self.position.y = screen_height - 40 - scaled_height
-                self.jumps_left = self.max_jumps
-            else:
-                self.velocity.y += gravity
+        # Stage walls and floor (physics.integrate does the same for arrays of bodies)
+        self.position.x = stage.clamp_x(self.position.x)
+        height = self.sprite_height * self.scale if self.transform_active else self.sprite_height
+        if self.position.y + height >= stage.floor:
+            if self.velocity.y > 0:
+                self.emit(DUST)
+            self.velocity.y = 0
+            self.position.y = stage.floor - height
+            self.jumps_left = self.max_jumps
         else:
-            if self.position.y + self.sprite_height >= screen_height - 40:
-                self.velocity.y = 0
-                self.position.y = screen_height - 40 - self.sprite_height
-                self.jumps_left = self.max_jumps
-            else:
-                self.velocity.y += gravity
+            self.velocity.y += gravity
 
         # Revert transformation after timer expires
-        if self.transform_active and pygame.time.get_ticks() >= self.transform_end_time:
-            self.revert_to_base()
+        if self.transform_active:
+            self.transform_ticks_left -= 1
+            if self.transform_ticks_left <= 0:
+                self.revert_to_base()
 
+    def update(self, surface, gravity, screen_height, screen_width):
+        self.simulate(gravity, Stage(0, 950, screen_height - 40))
         self.draw(surface)
 
+    # --- Rollback support ---
+    # save_state() packs everything simulate() and the match step can change
+    # into a preallocated float buffer (an array('d'), see
+    # simulation.MatchState.new_state_buffer); load_state() puts it back.
+    # Restoring only assigns attributes: the image is looked up in the sprites
+    # dict that is already loaded, so nothing is decoded or rebuilt.
+    STATE_SIZE = 18 + HealthComponent.STATE_SIZE
+
+    def save_state(self, buf, offset=0):
+        buf[offset] = self.position.x
+        buf[offset + 1] = self.position.y
+        buf[offset + 2] = self.velocity.x
+        buf[offset + 3] = self.velocity.y
+        buf[offset + 4] = self.attack_box_position.x
+        buf[offset + 5] = self.attack_box_position.y
+        buf[offset + 6] = self.frames_current
+        buf[offset + 7] = self.frames_elapsed
+        buf[offset + 8] = self.scale
+        buf[offset + 9] = self.damage
+        buf[offset + 10] = self.is_attacking
+        buf[offset + 11] = self.dead
+        buf[offset + 12] = self.jumps_left
+        buf[offset + 13] = self.transform_active
+        buf[offset + 14] = self.transform_count
+        buf[offset + 15] = self.transform_ticks_left
+        buf[offset + 16] = self.animation_id
+        buf[offset + 17] = self.facing
+        return self.health_comp.save_state(buf, offset + 18)
+
+    def load_state(self, buf, offset=0):
+        self.position.update(buf[offset], buf[offset + 1])
+        self.velocity.update(buf[offset + 2], buf[offset + 3])
+        self.attack_box_position.update(buf[offset + 4], buf[offset + 5])
+        self.frames_current = int(buf[offset + 6])
+        self.frames_elapsed = int(buf[offset + 7])
+        self.scale = buf[offset + 8]
+        self.damage = int(buf[offset + 9])
+        self.is_attacking = bool(buf[offset + 10])
+        self.dead = bool(buf[offset + 11])
+        self.jumps_left = int(buf[offset + 12])
+        self.transform_active = bool(buf[offset + 13])
+        self.transform_count = int(buf[offset + 14])
+        self.transform_ticks_left = int(buf[offset + 15])
+        self.previous_position.update(self.position)
+        # frames_max and the sprite size follow from the animation
+        self.set_animation(int(buf[offset + 16]))
+        self.facing = int(buf[offset + 17])
+        # Anything queued after the snapshot didn't happen
+        self.effect_events.clear()
+        return self.health_comp.load_state(buf, offset + 18)
+
     
     # def draw(self, surface):
     #     # Choose current frame
@@ -207,40 +317,63 @@ class Fighter(Sprite):
     #         y = self.position.y - (self.offset.y * (self.scale / self.base_scale))
     #     # Blit the sprite
     #     surface.blit(scaled_img, (x, y))
-    def draw(self, surface):
-        # 1) Pick the correct frame
-        frame_rect = pygame.Rect(
-            self.frames_current * self.sprite_width,
-            0,
-            self.sprite_width,
-            self.sprite_height
-        )
-        # 2) Scale it
-        scaled_w = int(self.sprite_width * self.scale)
-        scaled_h = int(self.sprite_height * self.scale)
-        scaled_img = pygame.transform.scale(
-            self.image.subsurface(frame_rect),
-            (scaled_w, scaled_h)
-        )
+    def draw(self, surface, alpha=1.0):
+        # 1) Pick the correct frame, already scaled (and trimmed) by the frame
+        # cache, mirrored/tinted as needed
+        scaled_img, (trim_x, trim_y) = self.current_frame(variant=self.variant())
+
+        # alpha < 1 draws part of the way from the previous tick's position
+        position = self.position if alpha >= 1 else self.previous_position.lerp(self.position, alpha)
+        x, y = self.sprite_origin(position)
 
-        # 3) Compute X the same way you have been
-        x = self.position.x - (self.offset.x * (self.scale / self.base_scale))
+        # 4) Draw it
+        return surface.blit(scaled_img, (x + trim_x, y + trim_y))
 
-        # 4) Compute Y:
+    # Top-left corner of the full scaled frame when drawn at position
+    def sprite_origin(self, position):
+        # 2) Compute X the same way you have been
+        x = position.x - (self.offset.x * (self.scale / self.base_scale))
+
+        # 3) Compute Y:
         if self.transform_active:
-            # Pin the bottom of the sprite to screen_height - 40
-            y = self.screen_height - 40 - scaled_h
+            # Pin the bottom of the sprite to the floor
+            y = self.stage.floor - int(self.sprite_height * self.scale)
             y = 120
         else:
             # Normal mode: use your standard offset logic
-            y = self.position.y - (self.offset.y * (self.scale / self.base_scale))
+            y = position.y - (self.offset.y * (self.scale / self.base_scale))
+        return x, y
+
+    # --- Facing and sprite variants ---
+
+    @property
+    def flipped(self):
+        return self.facing != self.sheet_facing
 
-        # 5) Draw it
-        surface.blit(scaled_img, (x, y))
+    def mirror_box(self, box):
+        # A box relative to position, as it is when the fighter faces the other way
+        x, y, width, height = box
+        return (2 * self.mirror_axis - x - width, y, width, height)
+
+    def attack_box(self):
+        box = (self.attack_box_offset.x, self.attack_box_offset.y) + tuple(self.attack_box_size)
+        return self.mirror_box(box) if self.flipped else box
+
+    def variant(self):
+        tint = FLASH if self.frame_event() == FLASH else self.tint
+        flipped = self.flipped
+        return PLAIN if not flipped and tint is None else (flipped, tint)
+
+    def variants(self):
+        # Everything variant() can return, for the atlas to prepare
+        return [(flipped, tint) for flipped in (False, True) for tint in (self.tint, FLASH)]
+
+    def emit(self, kind):
+        self.effect_events.append((self.effect_tick, kind))
 
     def attack(self):
         if not self.dead:
-            self.switch_sprite('attack1')
+            self.switch_animation(ATTACK1)
             self.is_attacking = True
 
     def take_hit(self, damage_amount):
@@ -254,10 +387,11 @@ class Fighter(Sprite):
         # else:
         #     self.switch_sprite('takeHit')
         self.health_comp.take_damage(damage_amount)
+        self.emit(HIT_SPARKS)
         if self.health_comp.current_hp <= 0:
-            self.switch_sprite('death')
+            self.switch_animation(DEATH)
         else:
-            self.switch_sprite('takeHit')
+            self.switch_animation(TAKE_HIT)
 
     # def transform(self, profile_name):
     #     if hasattr(self, 'transform_count') and self.transform_count >= 2:
@@ -303,12 +437,12 @@ class Fighter(Sprite):
             return
 
         self.scale = 3.0
-        self.damage = 40
         self.transform_active = True
-        self.transform_end_time = pygame.time.get_ticks() + 5000
+        self.transform_ticks_left = TRANSFORM_TICKS
         self.transform_count += 1
-        self.health_comp.invincible = True
-        self.damage = 10
+        self.health_comp.invincible = self.transform_invincible
+        self.damage = self.transform_damage
+        self.emit(AURA)
 
         # if hasattr(self, 'screen_height'):
         #     #self.position.y -= self.sprite_height * 0.25
@@ -333,18 +467,18 @@ class Fighter(Sprite):
         #     self.transform_active = False
     def revert_to_base(self):
         self.scale = 2.5    # Return to normal size
-        self.damage = 20    # Return to normal damage
+        self.damage = self.base_damage    # Return to normal damage
         self.transform_active = False
 
         # --- New: Reset Y position immediately ---
 
-        if hasattr(self, 'screen_height'):
+        if hasattr(self, 'stage'):
             #self.position.y += self.sprite_height * 0.5
              # Snap reverted sprite back to the ground
-            self.position.y = self.screen_height - 40 - self.sprite_height * self.scale
+            self.position.y = self.stage.floor - self.sprite_height * self.scale
 
         self.health_comp.invincible = False
-        self.damage = 20
+        self.emit(REVERT)
 
     # def switch_sprite(self, sprite_name):
     #     if self.image == self.sprites.get('death', {}).get('image'):
@@ -374,38 +508,28 @@ class Fighter(Sprite):
     #     self.frames_max = sprite['framesMax']
     #     self.frames_current = 0
     def switch_sprite(self, sprite_name):
-        # If already playing death animation and it’s not finished, do nothing
-        if self.image == self.sprites.get('death', {}).get('image'):
-            if self.frames_current < self.sprites['death']['framesMax'] - 1:
-                return
-            else:
-                self.dead = True
-                return
-
-        # If playing attack animation and it's not finished, don't interrupt it
-        if self.image == self.sprites.get('attack1', {}).get('image'):
-            if self.frames_current < self.sprites['attack1']['framesMax'] - 1:
-                return
-
-        # Same for takeHit animation
-        if self.image == self.sprites.get('takeHit', {}).get('image'):
-            if self.frames_current < self.sprites['takeHit']['framesMax'] - 1:
-                return
-
-        if self.dead:
-            return
-
-        sprite = self.sprites.get(sprite_name)
-        if not sprite or self.image == sprite['image']:
-            return
-
-        # --- Switch to new sprite ---
-        self.image = sprite['image']
-        self.frames_max = sprite['framesMax']
-        self.frames_current = 0  # IMPORTANT: reset current frame!
-
-        # --- ALSO update sprite width! ---
+        state = self.states.ids.get(sprite_name)
+        if state is not None:
+            self.switch_animation(state)
+
+    def switch_animation(self, state):
+        # death > takeHit > attack1 > movement, see animation.AnimationStates
+        action = self.states.transition(self.animation_id, state, self.frames_current)
+        if action == SWITCH:
+            self.set_animation(state)
+            self.frames_current = 0  # IMPORTANT: reset current frame!
+        elif action == DIE:
+            self.dead = True
+
+    def set_animation(self, state):
+        self.animation_id = state
+        self.animation = self.states.names[state]
+        self.image = self.sprite_image(self.animation)
+        self.frames_max = self.states.frames_max[state]
         self.sprite_width = self.image.get_width() // self.frames_max
         self.sprite_height = self.image.get_height()
+
+    def frame_event(self):
+        return self.states.event(self.animation_id, self.frames_current)
     
 
@@ -0,0 +1,119 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from animation import HIT
+
+# Hit detection for any number of fighters (or projectiles: anything with
+# the Fighter attributes used below).
+#
+# Boxes are (x, y, width, height) relative to the owner's position. A fighter
+# can define them per animation frame (Fighter.hitboxes / Fighter.hurtboxes,
+# loaded from the roster); without data the hurtbox is the whole frame and
+# the hitbox is the attack box on frames with a "hit" event (by default
+# attack1's hitFrame), tested like utils.rectangular_collision. Boxes are
+# authored for the way the sheets face and mirrored when the fighter has
+# turned around (Fighter.mirror_box).
+
+# Above this many hitbox x hurtbox candidates the narrow phase uses NumPy
+VECTORIZE_THRESHOLD = 256
+
+
+def hurtboxes(fighter):
+    table = fighter.hurtboxes.get(fighter.animation)
+    if table and table[fighter.frames_current % len(table)] is not None:
+        boxes = table[fighter.frames_current % len(table)]
+    else:
+        boxes = ((0, 0, fighter.sprite_width, fighter.sprite_height),)
+    if fighter.flipped:
+        return tuple(fighter.mirror_box(box) for box in boxes)
+    return boxes
+
+
+def hitboxes(fighter):
+    if not fighter.is_attacking:
+        return ()
+    table = fighter.hitboxes.get(fighter.animation)
+    if table:
+        boxes = table[fighter.frames_current % len(table)] or ()
+        if fighter.flipped:
+            return tuple(fighter.mirror_box(box) for box in boxes)
+        return boxes
+    if fighter.frame_event() == HIT:
+        return (fighter.attack_box(),)
+    return ()
+
+
+def attack_window_over(fighter):
+    # An attack that has reached its (last) hit frame can't hit any more
+    table = fighter.hitboxes.get(fighter.animation)
+    if table:
+        active = [i for i, boxes in enumerate(table) if boxes]
+        return not active or fighter.frames_current >= active[-1]
+    last = fighter.states.last_event[fighter.animation_id].get(HIT)
+    return last is None or fighter.frames_current >= last
+
+
+def world_boxes(fighters):
+    hits = []
+    hurts = []
+    for owner, fighter in enumerate(fighters):
+        # Attack boxes follow attack_box_position, which Fighter.simulate
+        # samples before moving; hurtboxes follow the current position
+        ax = fighter.attack_box_position.x - fighter.attack_box_offset.x
+        ay = fighter.attack_box_position.y - fighter.attack_box_offset.y
+        for x, y, w, h in hitboxes(fighter):
+            hits.append((ax + x, ay + y, ax + x + w, ay + y + h, owner))
+        px, py = fighter.position
+        for x, y, w, h in hurtboxes(fighter):
+            hurts.append((px + x, py + y, px + x + w, py + y + h, owner))
+    return hits, hurts
+
+
+def sweep_and_prune(hits, hurts):
+    # Sort every box by its left edge and only test boxes whose x ranges
+    # overlap. Edges touching count as a hit, like rectangular_collision.
+    events = sorted([(box[0], 0, box) for box in hits] + [(box[0], 1, box) for box in hurts],
+                    key=lambda e: e[0])
+    active_hits = []
+    active_hurts = []
+    pairs = set()
+    for x0, kind, box in events:
+        active_hits = [b for b in active_hits if b[2] >= x0]
+        active_hurts = [b for b in active_hurts if b[2] >= x0]
+        if kind == 0:
+            for hurt in active_hurts:
+                if hurt[4] != box[4] and box[3] >= hurt[1] and box[1] <= hurt[3]:
+                    pairs.add((box[4], hurt[4]))
+            active_hits.append(box)
+        else:
+            for hit in active_hits:
+                if hit[4] != box[4] and hit[3] >= box[1] and hit[1] <= box[3]:
+                    pairs.add((hit[4], box[4]))
+            active_hurts.append(box)
+    return pairs
+
+
+def batched_overlaps(hits, hurts):
+    a = np.asarray(hits, dtype=np.float64)
+    b = np.asarray(hurts, dtype=np.float64)
+    overlap = (
+        (a[:, None, 2] >= b[None, :, 0]) &
+        (a[:, None, 0] <= b[None, :, 2]) &
+        (a[:, None, 3] >= b[None, :, 1]) &
+        (a[:, None, 1] <= b[None, :, 3]) &
+        (a[:, None, 4] != b[None, :, 4])
+    )
+    hit_index, hurt_index = np.nonzero(overlap)
+    return {(int(a[i, 4]), int(b[j, 4])) for i, j in zip(hit_index, hurt_index)}
+
+
+# Returns the set of (attacker index, target index) pairs that connect this tick
+def find_hits(fighters):
+    hits, hurts = world_boxes(fighters)
+    if not hits or not hurts:
+        return set()
+    if np is not None and len(hits) * len(hurts) > VECTORIZE_THRESHOLD:
+        return batched_overlaps(hits, hurts)
+    return sweep_and_prune(hits, hurts)
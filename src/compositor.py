@@ -0,0 +1,109 @@
+import pygame
+
+
+# Keeps the static part of the scene (background, animated props and the
+# white wash on top of them) pre-composited in one opaque surface. Each
+# frame is then a single opaque blit; an animated layer only touches the
+# scene when its frame actually changes.
+class LayerCompositor:
+    def __init__(self, size, background, animated=(), wash=(255, 255, 255, 38)):
+        self.size = size
+        self.layers = list(animated)
+
+        raw = pygame.Surface(size)
+        background.draw(raw)
+
+        wash_surface = pygame.Surface(size, pygame.SRCALPHA)
+        wash_surface.fill(wash)
+
+        self.scene = raw.copy()
+        self.scene.blit(wash_surface, (0, 0))
+        if pygame.display.get_surface() is not None:
+            self.scene = self.scene.convert()
+
+        # One pre-washed patch per frame of every animated layer, cut from
+        # the background underneath it
+        self.patches = []
+        for layer in self.layers:
+            frames = []
+            for index in range(layer.frames_max):
+                frame, (trim_x, trim_y) = layer.current_frame(index)
+                x, y = layer.draw_position()
+                x, y = x + trim_x, y + trim_y
+                rect = frame.get_rect(topleft=(x, y)).clip(raw.get_rect())
+                patch = raw.subsurface(rect).copy()
+                patch.blit(frame, (x - rect.x, y - rect.y))
+                patch.blit(wash_surface, (0, 0), pygame.Rect(0, 0, rect.width, rect.height))
+                if pygame.display.get_surface() is not None:
+                    patch = patch.convert()
+                frames.append((patch, rect.topleft))
+            self.patches.append(frames)
+
+        self.shown = [None] * len(self.layers)
+        # Scene areas that changed since the renderer last looked
+        self.changed = []
+        self.recomposite()
+
+    def recomposite(self):
+        # Blit the patches of layers whose frame changed since the last call;
+        # the areas pile up in changed until the renderer picks them up
+        for i, layer in enumerate(self.layers):
+            if self.shown[i] != layer.frames_current:
+                patch, topleft = self.patches[i][layer.frames_current]
+                self.changed.append(self.scene.blit(patch, topleft))
+                self.shown[i] = layer.frames_current
+
+    def update(self, surface):
+        self.draw(surface)
+        self.advance()
+
+    def advance(self):
+        for layer in self.layers:
+            layer.animate_frames()
+        self.recomposite()
+
+    def draw(self, surface):
+        return surface.blit(self.scene, (0, 0))
+
+    def restore(self, surface, rects):
+        for rect in rects:
+            surface.blit(self.scene, rect, rect)
+
+
+# Presents a frame either with a full flip, or (when enabled) by restoring
+# only the areas drawn over last frame from the cached scene and pushing
+# just those rects to the display.
+class DirtyRectRenderer:
+    def __init__(self, scene, enabled=False):
+        self.scene = scene
+        self.enabled = enabled
+        self.previous = []
+        self.restored = []
+        self.current = []
+        self.full_redraw = True
+
+    def begin(self, surface):
+        if not self.enabled or self.full_redraw:
+            self.scene.draw(surface)
+            self.restored = []
+        else:
+            self.restored = self.previous + self.scene.changed
+            self.scene.restore(surface, self.restored)
+        self.scene.changed = []
+
+    def add(self, rect):
+        if rect:
+            self.current.append(rect)
+
+    def present(self):
+        if not self.enabled or self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.restored + self.current)
+        self.previous = self.current
+        self.current = []
+
+    def invalidate(self):
+        # Force the next frame to redraw and flip the whole screen
+        self.full_redraw = True
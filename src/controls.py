@@ -0,0 +1,62 @@
+import pygame
+
+# Per-tick input bits for one fighter. LEFT/RIGHT are "currently held",
+# everything else means "pressed since the last tick".
+LEFT = 1
+RIGHT = 2
+PRESS_LEFT = 4
+PRESS_RIGHT = 8
+JUMP = 16
+ATTACK = 32
+TRANSFORM = 64
+
+PLAYER_KEYS = {
+    pygame.K_a: LEFT,
+    pygame.K_d: RIGHT,
+    pygame.K_w: JUMP,
+    pygame.K_SPACE: ATTACK,
+    pygame.K_f: TRANSFORM,
+}
+
+ENEMY_KEYS = {
+    pygame.K_LEFT: LEFT,
+    pygame.K_RIGHT: RIGHT,
+    pygame.K_UP: JUMP,
+    pygame.K_DOWN: ATTACK,
+    pygame.K_RETURN: TRANSFORM,
+}
+
+
+# Turns KEYDOWN/KEYUP events into one input bitmask per tick
+class KeyboardInput:
+    def __init__(self, bindings):
+        self.bindings = bindings
+        self.held = 0
+        self.pressed = 0
+
+    def handle_event(self, event):
+        button = self.bindings.get(event.key)
+        if button is None:
+            return
+
+        if event.type == pygame.KEYDOWN:
+            if button == LEFT:
+                self.held |= LEFT
+                # Only the most recent direction press counts, like the old last_key
+                self.pressed = (self.pressed & ~PRESS_RIGHT) | PRESS_LEFT
+            elif button == RIGHT:
+                self.held |= RIGHT
+                self.pressed = (self.pressed & ~PRESS_LEFT) | PRESS_RIGHT
+            else:
+                self.pressed |= button
+        elif event.type == pygame.KEYUP:
+            self.held &= ~button
+
+    def poll(self):
+        bits = self.held | self.pressed
+        self.pressed = 0
+        return bits
+
+    def reset(self):
+        self.held = 0
+        self.pressed = 0
@@ -0,0 +1,213 @@
+import random
+import pygame
+try:
+    import numpy as np
+except ImportError:
+    # The kinds below are still importable (fighters queue events with
+    # them); only Effects itself needs numpy
+    np = None
+
+from physics import Bodies, Stage
+
+# Hit sparks, landing dust and transform auras. Purely cosmetic: fighters
+# only queue (tick, kind) events (Fighter.emit) and the game hands them
+# over with collect() after each tick, so lookahead searches and rollbacks
+# that restore a snapshot never leave stray particles behind.
+#
+# Particles live in preallocated arrays (motion in a physics.Bodies pool)
+# and are drawn with one Surface.blits() call over a blit list that is
+# built once and updated in place, from sprites that are tinted and faded
+# once up front, so a busy frame doesn't allocate per particle.
+# Particles need numpy; main.py plays without them when it's missing.
+
+HIT_SPARKS, DUST, AURA, REVERT = range(4)
+
+# Per kind: color, particle radius, (min, max) particles per burst, life
+# in ticks, gravity
+KINDS = {
+    HIT_SPARKS: {'color': (255, 230, 120), 'radius': 4, 'count': (10, 14), 'life': 18, 'gravity': 0.5},
+    DUST: {'color': (190, 170, 140), 'radius': 5, 'count': (6, 8), 'life': 20, 'gravity': 0.1},
+    AURA: {'color': (255, 90, 40), 'radius': 6, 'count': (28, 36), 'life': 40, 'gravity': -0.08},
+    REVERT: {'color': (200, 200, 210), 'radius': 5, 'count': (14, 18), 'life': 24, 'gravity': -0.05},
+}
+# Each kind shrinks and fades through this many pre-rendered sprites
+FADE_STEPS = 6
+MAX_PARTICLES = 512
+# Where free slots are blitted; SDL clips them away
+OFF_SCREEN = -10000
+
+
+def _dot(radius, color, alpha):
+    surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+    pygame.draw.circle(surface, (255, 255, 255, 255), (radius, radius), radius)
+    # Tint the white dot once here instead of every frame
+    surface.fill(color + (alpha,), special_flags=pygame.BLEND_RGBA_MULT)
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert_alpha()
+    return surface
+
+
+class Effects:
+    def __init__(self, size, floor, capacity=MAX_PARTICLES, seed=None):
+        if np is None:
+            raise ImportError("effects.Effects needs numpy")
+        self.capacity = capacity
+        self.rng = random.Random(seed)
+        # Particles may go right up to the screen edges
+        self.bodies = Bodies(Stage(0, size[0], floor), capacity)
+        self.gravity = np.zeros(capacity)
+        self.life = np.zeros(capacity, dtype=np.int64)
+        self.max_life = np.ones(capacity, dtype=np.int64)
+        self.kind = np.zeros(capacity, dtype=np.int64)
+        # Last tick whose events were turned into particles
+        self.last_tick = 0
+
+        # sprites[kind * FADE_STEPS + step], with the half-size offsets to center them
+        self.sprites = []
+        self.half_size = np.zeros(len(KINDS) * FADE_STEPS, dtype=np.int64)
+        for kind in range(len(KINDS)):
+            spec = KINDS[kind]
+            for step in range(FADE_STEPS):
+                radius = max(1, round(spec['radius'] * (FADE_STEPS - step) / FADE_STEPS))
+                alpha = 255 * (FADE_STEPS - step) // FADE_STEPS
+                self.sprites.append(_dot(radius, spec['color'], alpha))
+                self.half_size[kind * FADE_STEPS + step] = radius
+
+        # Per-frame scratch arrays, so draw() works in place
+        self.sprite_index = np.zeros(capacity, dtype=np.int64)
+        self.half = np.zeros(capacity, dtype=np.int64)
+        self.dead = np.zeros(capacity, dtype=bool)
+        self.changed = np.zeros(capacity, dtype=bool)
+        self.expired = np.zeros(capacity, dtype=bool)
+        # Sprite each blit item currently holds, -1 for none yet
+        self.shown = np.full(capacity, -1, dtype=np.int64)
+        self.positions = np.zeros((capacity, 2), dtype=np.int64)
+        # Blit list handed to Surface.blits() every frame: one [sprite, Rect]
+        # per slot, both updated in place. Free slots stay in it, parked
+        # off screen.
+        self.targets = [pygame.Rect(OFF_SCREEN, OFF_SCREEN, 0, 0) for _ in range(capacity)]
+        self.blit_items = [[self.sprites[0], target] for target in self.targets]
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def clear(self, tick=0):
+        self.bodies.clear()
+        self.last_tick = tick
+
+    # --- emitters ---
+
+    def burst(self, kind, x, y, width=0, height=0):
+        spec = KINDS[kind]
+        rng = self.rng
+        for _ in range(rng.randint(*spec['count'])):
+            if len(self.bodies) >= self.capacity:
+                # Full: drop new particles rather than grow mid-match
+                return
+            if kind == HIT_SPARKS:
+                vx, vy = rng.uniform(-7, 7), rng.uniform(-8, 2)
+            elif kind == DUST:
+                vx, vy = rng.choice((-1, 1)) * rng.uniform(1, 3), rng.uniform(-2.5, -0.5)
+            else:
+                vx, vy = rng.uniform(-0.6, 0.6), rng.uniform(-3, -1)
+            index = self.bodies.add(x + rng.uniform(0, width), y + rng.uniform(0, height), vx, vy)
+            life = spec['life'] + rng.randint(-4, 4)
+            self.life[index] = life
+            self.max_life[index] = life
+            self.kind[index] = kind
+            self.gravity[index] = spec['gravity']
+
+    def emit(self, kind, fighter):
+        left, top, width, height = body_rect(fighter)
+        if kind == HIT_SPARKS:
+            self.burst(kind, left + width / 2, top + height / 3)
+        elif kind == DUST:
+            self.burst(kind, left, top + height - 4, width)
+        else:
+            self.burst(kind, left, top, width, height)
+
+    def collect(self, state):
+        # Events from ticks already collected are replays (a rollback
+        # re-simulating them) and are skipped
+        for fighter in state.fighters:
+            for tick, kind in fighter.effect_events:
+                if tick > self.last_tick:
+                    self.emit(kind, fighter)
+            fighter.effect_events.clear()
+        self.last_tick = state.tick
+
+    # --- per tick / per frame ---
+
+    def advance(self):
+        if not len(self.bodies):
+            return
+        self.bodies.integrate(self.gravity)
+        alive = self.bodies.alive
+        self.life[alive] -= 1
+        expired = self.expired
+        np.less_equal(self.life, 0, out=expired)
+        expired &= alive
+        if expired.any():
+            self.bodies.remove_where(expired)
+
+    def draw(self, surface):
+        if not len(self.bodies):
+            return None
+        alive = self.bodies.alive
+        sprite = self.sprite_index
+        half = self.half
+        positions = self.positions
+        xs = positions[:, 0]
+        ys = positions[:, 1]
+
+        # sprite = kind * FADE_STEPS + how far through its life the particle is
+        np.subtract(self.max_life, self.life, out=sprite)
+        sprite *= FADE_STEPS
+        sprite //= self.max_life
+        np.minimum(sprite, FADE_STEPS - 1, out=sprite)
+        np.multiply(self.kind, FADE_STEPS, out=half)
+        sprite += half
+        np.take(self.half_size, sprite, out=half)
+
+        # Top-left corners, truncated like int(); free slots go off screen
+        np.copyto(xs, self.bodies.x, casting='unsafe')
+        np.copyto(ys, self.bodies.y, casting='unsafe')
+        xs -= half
+        ys -= half
+        np.logical_not(alive, out=self.dead)
+        np.copyto(positions, OFF_SCREEN, where=self.dead[:, None])
+
+        # Only slots whose fade step or kind changed need a new sprite
+        changed = self.changed
+        np.not_equal(sprite, self.shown, out=changed)
+        changed &= alive
+        if changed.any():
+            sprites = self.sprites
+            items = self.blit_items
+            for index in np.flatnonzero(changed).tolist():
+                items[index][0] = sprites[sprite[index]]
+            np.copyto(self.shown, sprite, where=changed)
+        # Rects rather than array rows as positions: blits() reads them
+        # much faster, and the ints set here don't outlive the frame
+        for target, x, y in zip(self.targets, xs.tolist(), ys.tolist()):
+            target.x = x
+            target.y = y
+        surface.blits(self.blit_items, doreturn=False)
+
+        # One rect around every particle, for the dirty rect renderer
+        pad = int(np.max(half, where=alive, initial=0)) * 2
+        left = int(np.min(xs, where=alive, initial=-OFF_SCREEN))
+        top = int(np.min(ys, where=alive, initial=-OFF_SCREEN))
+        right = int(np.max(xs, where=alive, initial=OFF_SCREEN))
+        bottom = int(np.max(ys, where=alive, initial=OFF_SCREEN))
+        return pygame.Rect(left, top, right - left + pad, bottom - top + pad)
+
+
+# The part of a fighter's frame the character is drawn in, as (left, top, width, height)
+def body_rect(fighter):
+    width = fighter.sprite_width * fighter.scale
+    height = fighter.sprite_height * fighter.scale
+    left, top = fighter.sprite_origin(fighter.position)
+    # The character takes up roughly the middle of its frame, standing on
+    # the line 60% of the way down
+    return left + width * 0.4, top + height * 0.32, width * 0.2, height * 0.28
@@ -0,0 +1,57 @@
+import pygame
+from collections import OrderedDict
+from variants import PLAIN, apply_variant
+
+
+# LRU cache of animation frames that are already sliced out of their sheet
+# and scaled, so drawing a sprite is a plain blit. Entries are
+# (surface, (dx, dy)): when a texture atlas is attached the surface is the
+# trimmed frame and (dx, dy) is where it sits inside the full scaled frame.
+# Mirrored and tinted variants (see variants.py) are cached the same way.
+class FrameCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.atlas = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image, frame_index, frame_width, frame_height, scale, variant=PLAIN):
+        # frame_width is part of the key because the same sheet can be
+        # sliced into a different number of frames (see the power profile)
+        key = (image, frame_index, frame_width, scale, variant)
+        frame = self.entries.get(key)
+        if frame is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return frame
+
+        self.misses += 1
+        atlas_frame = self.atlas.get(image, frame_index, frame_width, variant) if self.atlas else None
+        if atlas_frame is not None:
+            source = self.atlas.region(atlas_frame, variant)
+            trim_x, trim_y = atlas_frame.trim
+        else:
+            source = image.subsurface(pygame.Rect(frame_index * frame_width, 0, frame_width, frame_height))
+            if variant != PLAIN:
+                source = apply_variant(source, variant)
+            trim_x = trim_y = 0
+
+        if scale != 1:
+            width, height = source.get_size()
+            source = pygame.transform.scale(source, (int(width * scale), int(height * scale)))
+        frame = (source, (int(trim_x * scale), int(trim_y * scale)))
+
+        self.entries[key] = frame
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return frame
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by every Sprite so identical sheets are only scaled once
+frame_cache = FrameCache()
@@ -2,6 +2,8 @@
 import pygame
 
 class HealthComponent:
+    __slots__ = ('max_hp', 'current_hp', 'invincible')
+
     def __init__(self, max_hp):
         self.max_hp = max_hp
         self.current_hp = max_hp
@@ -15,6 +17,19 @@ class HealthComponent:
     def heal(self, amount):
         self.current_hp = min(self.max_hp, self.current_hp + amount)
 
+    # Rollback support, see Fighter.save_state
+    STATE_SIZE = 2
+
+    def save_state(self, buf, offset=0):
+        buf[offset] = self.current_hp
+        buf[offset + 1] = self.invincible
+        return offset + self.STATE_SIZE
+
+    def load_state(self, buf, offset=0):
+        self.current_hp = int(buf[offset])
+        self.invincible = bool(buf[offset + 1])
+        return offset + self.STATE_SIZE
+
 
 class HealthBar:
     def __init__(self, component, x, y, width, height):
@@ -29,4 +44,5 @@ class HealthBar:
         fg = self.rect.copy()
         fg.width = int(self.rect.width * pct)
         pygame.draw.rect(surface, (0, 255, 0), fg)
+        return self.rect
 
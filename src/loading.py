@@ -0,0 +1,57 @@
+import pygame
+from assets import assets
+from classes import DEFERRED_SPRITES
+from roster import get_roster
+from text_cache import text_cache
+
+
+# Image paths of the given characters, split into what the first frame
+# needs (idle first) and what can stream in while the match is running
+def character_assets(characters):
+    first = []
+    later = []
+    roster = get_roster()
+    for name in characters:
+        character = roster.get(name)
+        if character is None:
+            # create_fighter() reports unknown characters
+            continue
+        for animation, sprite in sorted(character['sprites'].items(), key=lambda item: item[0] != 'idle'):
+            (later if animation in DEFERRED_SPRITES else first).append(sprite['imageSrc'])
+        for profile in character['profiles'].values():
+            later += [sprite['imageSrc'] for sprite in profile['sprites'].values()]
+    return first, later
+
+
+# Progress bar shown while the asset pool decodes; finished images are
+# converted here on the main thread as they come in
+class LoadingScreen:
+    def __init__(self, screen, font, clock):
+        self.screen = screen
+        self.font = font
+        self.clock = clock
+        width, height = screen.get_size()
+        self.bar = pygame.Rect(width // 4, height // 2, width // 2, 24)
+
+    def run(self, paths, fps=60):
+        # Returns False if the window was closed before everything loaded
+        while True:
+            assets.convert_ready()
+            ready, total = assets.progress(paths)
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return False
+            self.draw(ready, total)
+            if ready == total:
+                return True
+            self.clock.tick(fps)
+
+    def draw(self, ready, total):
+        self.screen.fill((0, 0, 0))
+        pygame.draw.rect(self.screen, (255, 255, 255), self.bar, 2)
+        fill = self.bar.inflate(-6, -6)
+        fill.width = int(fill.width * ready / max(total, 1))
+        pygame.draw.rect(self.screen, (255, 255, 255), fill)
+        text = text_cache.render(self.font, f"Loading {ready}/{total}", True, (255, 255, 255))
+        self.screen.blit(text, text.get_rect(midbottom=(self.bar.centerx, self.bar.top - 10)))
+        pygame.display.flip()
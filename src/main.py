@@ -1,311 +1,295 @@
 import pygame
 import sys
-from classes import Fighter, Sprite
-from utils import rectangular_collision, update_timer, determine_winner
+import argparse
+import random
+from classes import Sprite
+from utils import update_timer, render_text
+from text_cache import text_cache
+from assets import assets
+from controls import KeyboardInput, PLAYER_KEYS, ENEMY_KEYS
+from simulation import WIDTH, HEIGHT, TICK_RATE, new_match, step, remaining_seconds
+from replay import InputRecorder, InputReplay, match_config, apply_config
+from profiler import FrameProfiler
+from compositor import LayerCompositor, DirtyRectRenderer
+from atlas import build_atlas
+from frame_cache import frame_cache
+from loading import LoadingScreen, character_assets
+from spectate import SpectatorBroadcaster
+from netplay import RollbackSession, UdpLink, parse_address, INPUT_DELAY
+from ai import POLICIES as CPU_POLICIES, LookaheadPolicy, FRAME_BUDGET
+from effects import Effects
 import os
 
+parser = argparse.ArgumentParser(description="2D Fighting Game")
+parser.add_argument('--record', metavar='PATH', help="record both players' inputs for this match")
+parser.add_argument('--replay', metavar='PATH', help="play back a recorded match instead of reading the keyboard")
+parser.add_argument('--seed', type=int, help="RNG seed (taken from the file when replaying)")
+parser.add_argument('--player-character', default='samuraiMack', help="character on the left (WASD)")
+parser.add_argument('--enemy-character', default='kenji', help="character on the right (arrow keys)")
+parser.add_argument('--dirty-rects', action='store_true',
+                    help="only redraw and push the screen areas that changed (for software-rendered displays)")
+parser.add_argument('--profile-csv', metavar='PATH', help="dump per-phase frame timings to a CSV file on exit")
+parser.add_argument('--netplay-peer', metavar='HOST:PORT', help="play online against the game running at this address")
+parser.add_argument('--netplay-port', type=int, default=7000, help="UDP port to listen on for netplay")
+parser.add_argument('--netplay-side', type=int, choices=(1, 2), default=1,
+                    help="which fighter this machine controls (with WASD); the peer picks the other one")
+parser.add_argument('--spectate-port', type=int, metavar='PORT',
+                    help="stream the match to spectate.py viewers on this TCP port")
+parser.add_argument('--max-fps', type=int, default=240,
+                    help="render at most this many frames per second (0: no limit); the game always runs at 60 ticks/s")
+parser.add_argument('--vsync', action='store_true', help="sync rendering to the display's refresh rate")
+parser.add_argument('--input-delay', type=int, default=INPUT_DELAY, help="netplay input delay in ticks")
+parser.add_argument('--cpu', choices=sorted(CPU_POLICIES), help="let the computer play the enemy")
+parser.add_argument('--kiosk', action='store_true',
+                    help="single-player cabinet: CPU enemy, demo matches while nobody plays, automatic restarts")
+args = parser.parse_args()
+if args.netplay_peer and args.replay:
+    parser.error("--replay can't be combined with --netplay-peer")
+if args.kiosk and not args.cpu:
+    args.cpu = 'lookahead'
+if args.cpu and (args.netplay_peer or args.replay):
+    parser.error("--cpu and --kiosk are for local matches")
+# Recordings store the seed as an unsigned 32-bit number
+if args.seed is not None and not 0 <= args.seed < 2 ** 32:
+    parser.error("--seed must be between 0 and 4294967295")
+
 pygame.init()
 
-WIDTH, HEIGHT = 1024, 576
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
+if args.vsync:
+    screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED, vsync=1)
+else:
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("2D Fighting Game")
 clock = pygame.time.Clock()
 font = pygame.font.SysFont("Arial", 36)
-
-gravity = 1.5
-start_time = pygame.time.get_ticks()
-game_over_flag = [False]
-
-print(os.path.abspath('../assets/img/background.png'))
-background = Sprite((0, 0), '../assets/img/background.png')
-shop = Sprite((600, 128), '../assets/img/shop.png', scale=2.75, frames_max=6)
-
-# def create_fighters():
-#     p = Fighter(
-#         position=(0, 0),
-#         velocity=(0, 0),
-#         image_path='../assets/img/samuraiMack/Idle.png',
-#         frames_max=8,
-#         scale=2.5,
-#         offset=(215, 157),
-#         sprites={
-#             'idle': {'imageSrc': '../assets/img/samuraiMack/Idle.png', 'framesMax': 8},
-#             'run': {'imageSrc': '../assets/img/samuraiMack/Run.png', 'framesMax': 8},
-#             'jump': {'imageSrc': '../assets/img/samuraiMack/Jump.png', 'framesMax': 2},
-#             'fall': {'imageSrc': '../assets/img/samuraiMack/Fall.png', 'framesMax': 2},
-#             'attack1': {'imageSrc': '../assets/img/samuraiMack/Attack1.png', 'framesMax': 6},
-#             'takeHit': {'imageSrc': '../assets/img/samuraiMack/Take Hit - white silhouette.png', 'framesMax': 4},
-#             'death': {'imageSrc': '../assets/img/samuraiMack/Death.png', 'framesMax': 6}
-#         },
-#         attack_box={'offset': (100, 50), 'width': 160, 'height': 50}
-#     )
-#     e = Fighter(
-#         position=(400, 100),
-#         velocity=(0, 0),
-#         color='blue',
-#         image_path='../assets/img/kenji/Idle.png',
-#         frames_max=4,
-#         scale=2.5,
-#         offset=(215, 167),
-#         sprites={
-#             'idle': {'imageSrc': '../assets/img/kenji/Idle.png', 'framesMax': 4},
-#             'run': {'imageSrc': '../assets/img/kenji/Run.png', 'framesMax': 8},
-#             'jump': {'imageSrc': '../assets/img/kenji/Jump.png', 'framesMax': 2},
-#             'fall': {'imageSrc': '../assets/img/kenji/Fall.png', 'framesMax': 2},
-#             'attack1': {'imageSrc': '../assets/img/kenji/Attack1.png', 'framesMax': 4},
-#             'takeHit': {'imageSrc': '../assets/img/kenji/Take hit.png', 'framesMax': 3},
-#             'death': {'imageSrc': '../assets/img/kenji/Death.png', 'framesMax': 7}
-#         },
-#         attack_box={'offset': (-170, 50), 'width': 170, 'height': 50}
-#     )
-
-#     return p, e
-
-def create_fighters():
-    p = Fighter(
-        position=(0, 0),
-        velocity=(0, 0),
-        image_path='../assets/img/samuraiMack/Idle.png',
-        frames_max=8,
-        scale=2.5,
-        offset=(215, 157),
-        sprites={
-            'idle': {'imageSrc': '../assets/img/samuraiMack/Idle.png', 'framesMax': 8},
-            'run': {'imageSrc': '../assets/img/samuraiMack/Run.png', 'framesMax': 8},
-            'jump': {'imageSrc': '../assets/img/samuraiMack/Jump.png', 'framesMax': 2},
-            'fall': {'imageSrc': '../assets/img/samuraiMack/Fall.png', 'framesMax': 2},
-            'attack1': {'imageSrc': '../assets/img/samuraiMack/Attack1.png', 'framesMax': 6},
-            'takeHit': {'imageSrc': '../assets/img/samuraiMack/Take Hit - white silhouette.png', 'framesMax': 4},
-            'death': {'imageSrc': '../assets/img/samuraiMack/Death.png', 'framesMax': 6}
-        },
-        attack_box={'offset': (100, 50), 'width': 160, 'height': 50},
-        character_profiles={
-            'base': {
-                'damage': 20,
-                'sprites': {
-                    'idle': {'imageSrc': '../assets/img/samuraiMack/Idle.png', 'framesMax': 8},
-                    'run': {'imageSrc': '../assets/img/samuraiMack/Run.png', 'framesMax': 8},
-                    'jump': {'imageSrc': '../assets/img/samuraiMack/Jump.png', 'framesMax': 2},
-                    'fall': {'imageSrc': '../assets/img/samuraiMack/Fall.png', 'framesMax': 2},
-                    'attack1': {'imageSrc': '../assets/img/samuraiMack/Attack1.png', 'framesMax': 6},
-                    'takeHit': {'imageSrc': '../assets/img/samuraiMack/Take Hit - white silhouette.png', 'framesMax': 4},
-                    'death': {'imageSrc': '../assets/img/samuraiMack/Death.png', 'framesMax': 6}
-                }
-            },
-            'power': {
-                'damage': 40,
-                'sprites': {
-                    'idle': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 8},
-                    'run': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 8},
-                    'jump': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 2},
-                    'fall': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 2},
-                    'attack1': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 6},
-                    'takeHit': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 4},
-                    'death': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 6}
-                }
-            }
-        }
-    )
-
-    e = Fighter(
-        position=(400, 100),
-        velocity=(0, 0),
-        color='blue',
-        image_path='../assets/img/kenji/Idle.png',
-        frames_max=4,
-        scale=2.5,
-        offset=(215, 167),
-        sprites={
-            'idle': {'imageSrc': '../assets/img/kenji/Idle.png', 'framesMax': 4},
-            'run': {'imageSrc': '../assets/img/kenji/Run.png', 'framesMax': 8},
-            'jump': {'imageSrc': '../assets/img/kenji/Jump.png', 'framesMax': 2},
-            'fall': {'imageSrc': '../assets/img/kenji/Fall.png', 'framesMax': 2},
-            'attack1': {'imageSrc': '../assets/img/kenji/Attack1.png', 'framesMax': 4},
-            'takeHit': {'imageSrc': '../assets/img/kenji/Take hit.png', 'framesMax': 3},
-            'death': {'imageSrc': '../assets/img/kenji/Death.png', 'framesMax': 7}
-        },
-        attack_box={'offset': (-170, 50), 'width': 170, 'height': 50},
-        character_profiles={
-            'base': {
-                'damage': 20,
-                'sprites': {
-                    'idle': {'imageSrc': '../assets/img/kenji/Idle.png', 'framesMax': 4},
-                    'run': {'imageSrc': '../assets/img/kenji/Run.png', 'framesMax': 8},
-                    'jump': {'imageSrc': '../assets/img/kenji/Jump.png', 'framesMax': 2},
-                    'fall': {'imageSrc': '../assets/img/kenji/Fall.png', 'framesMax': 2},
-                    'attack1': {'imageSrc': '../assets/img/kenji/Attack1.png', 'framesMax': 4},
-                    'takeHit': {'imageSrc': '../assets/img/kenji/Take hit.png', 'framesMax': 3},
-                    'death': {'imageSrc': '../assets/img/kenji/Death.png', 'framesMax': 7}
-                }
-            },
-            'power': {
-                'damage': 40,
-                'sprites': {
-                    'idle': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 8},
-                    'run': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 8},
-                    'jump': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 2},
-                    'fall': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 2},
-                    'attack1': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 6},
-                    'takeHit': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 4},
-                    'death': {'imageSrc': '../assets/img/powerup/char_blue_2.png', 'framesMax': 6}
-                }
-            }
-        }
-    )
-    
-    return p, e
-
-player, enemy = create_fighters()
-# Position the enemy's health bar at the top-right
-enemy.health_bar.rect.x = WIDTH - enemy.health_bar.rect.width - 20
-keys = {'a': False, 'd': False, 'w': False, 'left': False, 'right': False, 'up': False}
-player_last_key = ''
-enemy_last_key = ''
+small_font = pygame.font.SysFont("Arial", 14)
+
+replay = InputReplay(args.replay) if args.replay else None
+seed = replay.seed if replay else args.seed
+if seed is None:
+    seed = random.getrandbits(32)
+random.seed(seed)
+
+characters = (args.player_character, args.enemy_character)
+if replay:
+    characters = replay.config.get('characters', characters)
+
+# Decode images on the thread pool while a loading bar is up: the stage and
+# the animations the match starts with first, then death and the transform
+# profiles, which keep streaming in during the match
+BACKGROUND = '../assets/img/background.png'
+SHOP = '../assets/img/shop.png'
+first_assets, later_assets = character_assets(characters)
+first_assets = [BACKGROUND, SHOP] + first_assets
+assets.preload(first_assets)
+assets.preload(later_assets)
+if not LoadingScreen(screen, font, clock).run(first_assets):
+    pygame.quit()
+    sys.exit()
+
+print(os.path.abspath(BACKGROUND))
+background = Sprite((0, 0), BACKGROUND)
+shop = Sprite((600, 128), SHOP, scale=2.75, frames_max=6)
+# Background, shop and the white wash are pre-composited into one opaque surface
+scene = LayerCompositor((WIDTH, HEIGHT), background, animated=[shop])
+renderer = DirtyRectRenderer(scene, enabled=args.dirty_rects)
+
+
+def start_match(characters):
+    state = new_match(*characters)
+    # Position the enemy's health bar at the top-right
+    state.enemy.health_bar.rect.x = WIDTH - state.enemy.health_bar.rect.width - 20
+    return state
+
+
+state = start_match(characters)
+if replay:
+    apply_config(state, replay.config)
+    replay_inputs = iter(replay)
+recorder = InputRecorder(args.record, seed, match_config(state)) if args.record else None
+
+# Online play: both machines simulate the match, only inputs are exchanged
+session = None
+if args.netplay_peer:
+    link = UdpLink(('0.0.0.0', args.netplay_port), parse_address(args.netplay_peer))
+    session = RollbackSession(state, args.netplay_side - 1, link, args.input_delay)
+
+broadcaster = None
+if args.spectate_port:
+    broadcaster = SpectatorBroadcaster({'characters': list(characters)}, '0.0.0.0', args.spectate_port)
+# Restarting restores this snapshot instead of building new fighters
+initial_state = state.save_state(state.new_state_buffer())
+
+# Pack every fighter frame into trimmed atlas pages; the frame cache scales from those
+frame_cache.atlas = build_atlas(state.fighters)
+player_input = KeyboardInput(PLAYER_KEYS)
+enemy_input = KeyboardInput(ENEMY_KEYS)
+
+# CPU opponent; in kiosk mode a second one plays the player side until
+# someone touches the controls
+def new_cpu(seed):
+    policy = CPU_POLICIES[args.cpu](random.Random(seed))
+    if isinstance(policy, LookaheadPolicy):
+        # Never let a search cost a frame, even on a busy machine
+        policy.budget = FRAME_BUDGET
+    return policy
+
+
+cpu = new_cpu(seed) if args.cpu else None
+demo_cpu = new_cpu(seed + 1) if args.kiosk else None
+KIOSK_IDLE_TICKS = 20 * TICK_RATE
+KIOSK_RESTART_TICKS = 5 * TICK_RATE
+idle_ticks = KIOSK_IDLE_TICKS
+# Particles settle on the ground drawn in background.png
+try:
+    effects = Effects((WIDTH, HEIGHT), HEIGHT - 96, seed=seed)
+except ImportError:
+    # Particles need numpy; the game is the same without them
+    effects = None
+# F3 toggles the frame-time graph
+profiler = FrameProfiler(['events', 'simulation', 'scene', 'player', 'enemy', 'effects', 'hud', 'flip'])
+
+# The simulation runs in fixed ticks and rendering at whatever rate the
+# display manages: each frame runs the ticks that are due, then draws the
+# fighters interpolated between the last two ticks. A slow frame runs
+# several ticks before drawing again (frame skipping); beyond MAX_CATCH_UP
+# the game slows down rather than spiralling.
+TICK_MS = 1000 / TICK_RATE
+MAX_CATCH_UP = 5
+accumulator = 0.0
 
 running = True
+restart = False
 while running:
-    clock.tick(60)
-    screen.fill((0, 0, 0))
-
-    background.update(screen)
-    shop.update(screen)
-
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-    overlay.fill((255, 255, 255, 38))
-    screen.blit(overlay, (0, 0))
-
-    player.update(screen, gravity, HEIGHT, WIDTH)
-    enemy.update(screen, gravity, HEIGHT, WIDTH)
-
-    player.velocity.x = 0
-    enemy.velocity.x = 0
-
-    if not player.dead:
-        if keys['a'] and player_last_key == 'a':
-            player.velocity.x = -5
-            player.switch_sprite('run')
-        elif keys['d'] and player_last_key == 'd':
-            player.velocity.x = 5
-            player.switch_sprite('run')
-        else:
-            player.switch_sprite('idle')
-
-        if player.velocity.y < 0:
-            player.switch_sprite('jump')
-        elif player.velocity.y > 0:
-            player.switch_sprite('fall')
+    accumulator = min(accumulator + clock.tick(args.max_fps), MAX_CATCH_UP * TICK_MS)
+    profiler.begin_frame()
 
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
 
-    if not enemy.dead:
-        if keys['left'] and enemy_last_key == 'left':
-            enemy.velocity.x = -5
-            enemy.switch_sprite('run')
-        elif keys['right'] and enemy_last_key == 'right':
-            enemy.velocity.x = 5
-            enemy.switch_sprite('run')
+        elif event.type in (pygame.KEYDOWN, pygame.KEYUP):
+            player_input.handle_event(event)
+            enemy_input.handle_event(event)
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+
+            # Someone walked up to the kiosk: end the demo and start a fresh match
+            if event.type == pygame.KEYDOWN and demo_cpu:
+                if idle_ticks >= KIOSK_IDLE_TICKS:
+                    restart = True
+                idle_ticks = 0
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_r and state.game_over and not replay and not session:
+                restart = True
+
+    # Kiosks start the next match on their own
+    if args.kiosk and state.game_over and state.tick - state.game_over_tick >= KIOSK_RESTART_TICKS:
+        restart = True
+    if restart:
+        restart = False
+        state.load_state(initial_state)
+        if effects:
+            effects.clear()
+        # A recording covers a single match
+        if recorder:
+            recorder.close()
+            recorder = None
+
+    # Hand deferred animations to the fighters and the atlas once decoded
+    if later_assets:
+        assets.convert_ready()
+        if assets.is_ready(later_assets):
+            for fighter in state.fighters:
+                fighter.load_sprites()
+                frame_cache.atlas.add_fighter(fighter)
+            frame_cache.atlas.pack()
+            later_assets = None
+
+    profiler.mark('events')
+
+    # --- Simulation ---
+    ticks_run = 0
+    while accumulator >= TICK_MS:
+        accumulator -= TICK_MS
+        ticks_run += 1
+        if session:
+            session.advance(player_input.poll())
+            # Only inputs both sides agree on go into the recording
+            if recorder:
+                for inputs in session.confirmed_inputs(recorder.ticks):
+                    recorder.record(inputs)
         else:
-            enemy.switch_sprite('idle')
-
-        if enemy.velocity.y < 0:
-            enemy.switch_sprite('jump')
-        elif enemy.velocity.y > 0:
-            enemy.switch_sprite('fall')
-
-    if rectangular_collision(player, enemy) and player.is_attacking and player.frames_current == 4:
-        #enemy.take_hit()
-        enemy.take_hit(player.damage)
-        player.is_attacking = False
-
-    if player.is_attacking and player.frames_current == 4:
-        player.is_attacking = False
-
-    if rectangular_collision(enemy, player) and enemy.is_attacking and enemy.frames_current == 2:
-        #player.take_hit()
-        player.take_hit(enemy.damage)
-        enemy.is_attacking = False
-
-    if enemy.is_attacking and enemy.frames_current == 2:
-        enemy.is_attacking = False
-
-    #if enemy.health <= 0 and not enemy.dead:
-    if enemy.health_comp.current_hp <= 0 and not enemy.dead:
-        enemy.switch_sprite('death')
-    #elif player.health <= 0 and not player.dead:
-    elif player.health_comp.current_hp <= 0 and not player.dead:
-        player.switch_sprite('death')
-
-   # if (enemy.health <= 0 or player.health <= 0) and not game_over_flag[0]:
-    if (enemy.health_comp.current_hp <= 0 or player.health_comp.current_hp <= 0) and not game_over_flag[0]:
-        determine_winner(player, enemy, font, screen)
-        game_over_flag[0] = True
-
-    if game_over_flag[0]:
-        restart_text = font.render("Press R to Restart", True, (255, 255, 0))
+            if replay:
+                inputs = next(replay_inputs, (0, 0))
+            else:
+                player_bits = player_input.poll()
+                if demo_cpu:
+                    idle_ticks = idle_ticks + 1 if player_bits == 0 else 0
+                    if idle_ticks >= KIOSK_IDLE_TICKS:
+                        player_bits = demo_cpu(state, 0)
+                inputs = (player_bits, cpu(state, 1) if cpu else enemy_input.poll())
+            if recorder:
+                recorder.record(inputs)
+            step(state, inputs)
+        if effects:
+            effects.collect(state)
+            effects.advance()
+        if broadcaster:
+            broadcaster.publish(state)
+        # The shop animates in ticks too
+        scene.advance()
+    profiler.mark('simulation')
+
+    # --- Rendering ---
+    alpha = accumulator / TICK_MS
+    renderer.begin(screen)
+    profiler.mark('scene')
+
+    renderer.add(state.player.draw(screen, alpha))
+    profiler.mark('player')
+    renderer.add(state.enemy.draw(screen, alpha))
+    profiler.mark('enemy')
+    if effects:
+        renderer.add(effects.draw(screen))
+    profiler.mark('effects')
+
+    # Shown on the frame that ran the tick the match ended on
+    if state.game_over and state.tick - ticks_run < state.game_over_tick <= state.tick:
+        renderer.add(render_text(screen, state.winner, font))
+
+    if state.game_over:
+        restart_text = text_cache.render(font, "Press R to Restart", True, (255, 255, 0))
         restart_rect = restart_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 50))
-        screen.blit(restart_text, restart_rect)
+        renderer.add(screen.blit(restart_text, restart_rect))
+
+    if demo_cpu and idle_ticks >= KIOSK_IDLE_TICKS:
+        demo_text = text_cache.render(font, "Press any key to play", True, (255, 255, 0))
+        renderer.add(screen.blit(demo_text, demo_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 50))))
 
-    update_timer(screen, font, start_time, player, enemy, game_over_flag)
+    renderer.add(update_timer(screen, font, remaining_seconds(state)))
 
     # pygame.draw.rect(screen, (255, 0, 0), (20, 20, 200, 20))
     # pygame.draw.rect(screen, (0, 255, 0), (20, 20, 200 * (player.health / 100), 20))
     # pygame.draw.rect(screen, (255, 0, 0), (WIDTH - 220, 20, 200, 20))
     # pygame.draw.rect(screen, (0, 255, 0), (WIDTH - 220, 20, 200 * (enemy.health / 100), 20))
-    player.health_bar.draw(screen)
-    enemy.health_bar.draw(screen)
-
-    pygame.display.flip()
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        elif event.type == pygame.KEYDOWN:
-            if not player.dead:
-                if event.key == pygame.K_a:
-                    keys['a'] = True
-                    player_last_key = 'a'
-                elif event.key == pygame.K_d:
-                    keys['d'] = True
-                    player_last_key = 'd'
-                elif event.key == pygame.K_w and player.jumps_left > 0:
-                    player.velocity.y = -30
-                    player.jumps_left -= 1
-                elif event.key == pygame.K_SPACE:
-                    player.attack()
-                elif event.key == pygame.K_f:
-                    player.transform()
-
-            if not enemy.dead:
-                if event.key == pygame.K_LEFT:
-                    keys['left'] = True
-                    enemy_last_key = 'left'
-                elif event.key == pygame.K_RIGHT:
-                    keys['right'] = True
-                    enemy_last_key = 'right'
-                elif event.key == pygame.K_UP and enemy.jumps_left > 0:
-                    enemy.velocity.y = -30
-                    enemy.jumps_left -= 1
-                elif event.key == pygame.K_DOWN:
-                    enemy.attack()
-                elif event.key == pygame.K_RETURN:
-                    enemy.transform()
-
-            if event.key == pygame.K_r and game_over_flag[0]:
-                player, enemy = create_fighters()
-                # Reposition enemy health bar after restart
-                enemy.health_bar.rect.x = WIDTH - enemy.health_bar.rect.width - 20
-                start_time = pygame.time.get_ticks()
-                game_over_flag[0] = False
-
-        elif event.type == pygame.KEYUP:
-            if event.key == pygame.K_a:
-                keys['a'] = False
-            elif event.key == pygame.K_d:
-                keys['d'] = False
-            elif event.key == pygame.K_LEFT:
-                keys['left'] = False
-            elif event.key == pygame.K_RIGHT:
-                keys['right'] = False
-
+    renderer.add(state.player.health_bar.draw(screen))
+    renderer.add(state.enemy.health_bar.draw(screen))
+    renderer.add(profiler.draw(screen, small_font))
+    profiler.mark('hud')
+
+    renderer.present()
+    profiler.mark('flip')
+    profiler.end_frame()
+
+if recorder:
+    recorder.close()
+if session:
+    session.link.close()
+if broadcaster:
+    broadcaster.close()
+if args.profile_csv:
+    profiler.dump_csv(args.profile_csv)
 pygame.quit()
 sys.exit()
@@ -0,0 +1,289 @@
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+import threading
+import time
+from collections import deque
+
+from controls import LEFT, RIGHT
+from simulation import TICK_RATE, new_match, step
+
+# Peer-to-peer rollback netplay. Each side simulates the whole match; only
+# input bitmasks go over the wire. A packet repeats every local input the
+# peer hasn't acknowledged yet, so lost packets need no retransmission logic:
+#   magic, first frame in the packet, next remote frame we are waiting for,
+#   input count, then one byte of controls bits per frame
+MAGIC = b'FN'
+PACKET = struct.Struct('<2sIIH')
+
+INPUT_DELAY = 2
+MAX_ROLLBACK = 8
+
+
+# Remote inputs we haven't received yet are guessed: the held directions
+# probably stay held, one-shot presses probably didn't happen
+def predict(last_bits):
+    return last_bits & (LEFT | RIGHT)
+
+
+# Runs the match for one side of a netplay game. Frame N is the step() that
+# takes the match from tick N to N + 1. Local inputs are scheduled
+# input_delay frames ahead; remote inputs that arrive too late for their
+# frame are predicted, and a wrong prediction rewinds to a snapshot
+# (MatchState.load_state) and re-simulates up to the current frame.
+class RollbackSession:
+    def __init__(self, state, local_index, link, input_delay=INPUT_DELAY, max_rollback=MAX_ROLLBACK):
+        self.state = state
+        self.local_index = local_index
+        self.link = link
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.frame = 0
+        # Inputs by frame; the first input_delay local frames are empty
+        self.local_inputs = [0] * input_delay
+        self.remote_inputs = []
+        # Remote bits we simulated unconfirmed frames with
+        self.predicted = {}
+        self.pending_bits = 0
+        self.rollback_frame = None
+        # First local frame the peer hasn't confirmed
+        self.remote_ack = 0
+        # Snapshot taken before each of the last max_rollback + 1 frames
+        self.snapshots = [state.new_state_buffer() for _ in range(max_rollback + 1)]
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.stalls = 0
+
+    @property
+    def confirmed_frame(self):
+        return min(self.frame, len(self.remote_inputs))
+
+    def inputs_for(self, frame, remote_bits):
+        if self.local_index == 0:
+            return self.local_inputs[frame], remote_bits
+        return remote_bits, self.local_inputs[frame]
+
+    # Confirmed (player bits, enemy bits) from start up to confirmed_frame
+    def confirmed_inputs(self, start=0):
+        return [self.inputs_for(frame, self.remote_inputs[frame]) for frame in range(start, self.confirmed_frame)]
+
+    def receive(self, data):
+        if len(data) < PACKET.size:
+            return
+        magic, first, ack, count = PACKET.unpack_from(data)
+        if magic != MAGIC or len(data) < PACKET.size + count:
+            return
+        self.remote_ack = max(self.remote_ack, ack)
+        for frame, bits in enumerate(data[PACKET.size:PACKET.size + count], first):
+            if frame < len(self.remote_inputs):
+                continue
+            if frame > len(self.remote_inputs):
+                # Arrived out of order; the missing frames come again in the next packet
+                break
+            self.remote_inputs.append(bits)
+            if frame < self.frame and self.predicted.pop(frame) != bits:
+                if self.rollback_frame is None or frame < self.rollback_frame:
+                    self.rollback_frame = frame
+            else:
+                self.predicted.pop(frame, None)
+
+    def poll(self):
+        inbox = self.link.inbox
+        while inbox:
+            self.receive(inbox.popleft())
+
+    def send(self):
+        payload = bytes(self.local_inputs[self.remote_ack:])
+        self.link.send(PACKET.pack(MAGIC, self.remote_ack, len(self.remote_inputs), len(payload)) + payload)
+
+    def simulate_frame(self, frame):
+        self.state.save_state(self.snapshots[frame % len(self.snapshots)])
+        if frame < len(self.remote_inputs):
+            remote_bits = self.remote_inputs[frame]
+        else:
+            remote_bits = predict(self.remote_inputs[-1] if self.remote_inputs else 0)
+            self.predicted[frame] = remote_bits
+        step(self.state, self.inputs_for(frame, remote_bits))
+
+    def rollback(self):
+        frame = self.rollback_frame
+        self.rollback_frame = None
+        self.state.load_state(self.snapshots[frame % len(self.snapshots)])
+        for resim in range(frame, self.frame):
+            self.simulate_frame(resim)
+        self.rollbacks += 1
+        self.resimulated += self.frame - frame
+
+    # Receive, fix up mispredictions and send, without advancing
+    def sync(self):
+        self.poll()
+        if self.rollback_frame is not None:
+            self.rollback()
+        self.send()
+
+    # Advance one frame with this tick's local input. Returns False when the
+    # peer is too far behind to predict; the input is kept for the next frame.
+    def advance(self, bits):
+        self.poll()
+        if self.rollback_frame is not None:
+            self.rollback()
+
+        if self.frame - len(self.remote_inputs) >= self.max_rollback:
+            self.pending_bits |= bits
+            self.stalls += 1
+            self.send()
+            return False
+
+        self.local_inputs.append(bits | self.pending_bits)
+        self.pending_bits = 0
+        self.simulate_frame(self.frame)
+        self.frame += 1
+        self.send()
+        return True
+
+
+class _InboxProtocol(asyncio.DatagramProtocol):
+    def __init__(self, inbox):
+        self.inbox = inbox
+
+    def datagram_received(self, data, addr):
+        self.inbox.append(data)
+
+    def error_received(self, exc):
+        # The peer isn't listening yet (ICMP port unreachable); keep sending
+        pass
+
+
+# UDP endpoint for the game loop. asyncio runs on a background thread so
+# main.py's loop stays synchronous; received packets wait in inbox.
+class UdpLink:
+    def __init__(self, local_addr, remote_addr):
+        self.inbox = deque()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        endpoint = self.loop.create_datagram_endpoint(
+            lambda: _InboxProtocol(self.inbox), local_addr=local_addr, remote_addr=remote_addr)
+        self.transport, _ = asyncio.run_coroutine_threadsafe(endpoint, self.loop).result()
+
+    def send(self, data):
+        self.loop.call_soon_threadsafe(self.transport.sendto, data)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.transport.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+# In-process stand-in for UdpLink that delays, reorders and drops packets
+class LoopbackLink:
+    def __init__(self, loop, rng, latency=0.03, jitter=0.0, loss=0.0):
+        self.loop = loop
+        self.rng = rng
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.inbox = deque()
+        self.peer = None
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, data):
+        self.sent += 1
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        self.loop.call_later(delay, self.peer.inbox.append, data)
+
+
+def loopback_pair(loop, rng, **link_options):
+    a = LoopbackLink(loop, rng, **link_options)
+    b = LoopbackLink(loop, rng, **link_options)
+    a.peer, b.peer = b, a
+    return a, b
+
+
+async def _run_peer(session, policy, ticks, interval):
+    loop = asyncio.get_running_loop()
+    next_time = loop.time()
+    while session.frame < ticks:
+        session.advance(policy(session.state, session.local_index))
+        next_time += interval
+        await asyncio.sleep(max(0.0, next_time - loop.time()))
+    # Keep exchanging packets until every remote input is confirmed
+    while session.confirmed_frame < ticks:
+        session.sync()
+        await asyncio.sleep(interval)
+
+
+# Plays one match between two sessions over a simulated network and checks
+# that both ended in the same state as an offline run of the same inputs
+async def run_loopback(ticks=600, latency=0.03, jitter=0.01, loss=0.05, input_delay=INPUT_DELAY,
+                       max_rollback=MAX_ROLLBACK, policy='chase', seed=0, speed=1.0):
+    from batch import POLICIES
+
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    links = loopback_pair(loop, rng, latency=latency / speed, jitter=jitter / speed, loss=loss)
+    sessions = [RollbackSession(new_match(), index, link, input_delay, max_rollback)
+                for index, link in enumerate(links)]
+    policies = [POLICIES[policy](random.Random(seed + index + 1)) for index in range(2)]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_run_peer(session, policy, ticks, 1 / (TICK_RATE * speed))
+                           for session, policy in zip(sessions, policies)))
+    elapsed = time.perf_counter() - started
+
+    offline = new_match()
+    for inputs in sessions[0].confirmed_inputs():
+        step(offline, inputs)
+    expected = offline.save_state(offline.new_state_buffer())
+    in_sync = all(s.state.save_state(s.state.new_state_buffer()) == expected for s in sessions)
+
+    return {
+        'ticks': ticks,
+        'seconds': round(elapsed, 2),
+        'in_sync': in_sync,
+        'winner': offline.winner,
+        'rollbacks': [s.rollbacks for s in sessions],
+        'resimulated_frames': [s.resimulated for s in sessions],
+        'stalls': [s.stalls for s in sessions],
+        'packets_sent': [link.sent for link in links],
+        'packets_dropped': [link.dropped for link in links],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run two rollback netplay peers over a simulated network.")
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--latency', type=float, default=45, help="one-way latency in ms")
+    parser.add_argument('--jitter', type=float, default=10, help="latency +/- this many ms")
+    parser.add_argument('--loss', type=float, default=0.05, help="fraction of packets dropped")
+    parser.add_argument('--input-delay', type=int, default=INPUT_DELAY)
+    parser.add_argument('--max-rollback', type=int, default=MAX_ROLLBACK)
+    parser.add_argument('--policy', default='chase')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--speed', type=float, default=1.0, help="run this many times faster than real time")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run_loopback(
+        args.ticks, args.latency / 1000, args.jitter / 1000, args.loss, args.input_delay,
+        args.max_rollback, args.policy, args.seed, args.speed))
+    print(json.dumps(result))
+    if not result['in_sync']:
+        raise SystemExit("peers desynced")
+
+
+if __name__ == '__main__':
+    main()
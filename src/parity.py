@@ -0,0 +1,138 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from batch import ChasePolicy, RandomPolicy
+from bulk import BulkMatches, POS_X, POS_Y, HP, ANIM, FRAME, FACING
+from simulation import new_match, step
+
+# Checks that the fast paths play the same game as simulation.step:
+#   bulk:      BulkMatches against the object simulation, tick for tick
+#   snapshots: save_state/load_state (and BulkMatches.snapshot/restore)
+#              followed by a re-simulation end up in the same state
+# Each runs for a normal match and a mirror match. Run it after touching
+# simulation, classes, bulk or the roster:
+#
+#   python parity.py
+CASES = (('samuraiMack', 'kenji'), ('samuraiMack', 'samuraiMack'))
+
+
+def _policies(count, seed):
+    # Half the matches chase, half mash buttons, so both sides get hit,
+    # jump, turn around and transform
+    policies = []
+    for i in range(count):
+        policy = ChasePolicy if i % 2 else RandomPolicy
+        policies.append((policy(random.Random(seed + i)), policy(random.Random(seed + 1000 + i))))
+    return policies
+
+
+def _fighter_fields(fighter):
+    return (fighter.position.x, fighter.position.y, fighter.health_comp.current_hp,
+            fighter.frames_current, fighter.animation_id, fighter.facing)
+
+
+def _bulk_fields(bulk, column):
+    return tuple(bulk.fighters[(POS_X, POS_Y, HP, FRAME, ANIM, FACING), column].tolist())
+
+
+# Returns the first difference as a message, or None
+def check_bulk(characters, matches=16, ticks=3600, seed=0):
+    policies = _policies(matches, seed)
+    states = [new_match(*characters) for _ in range(matches)]
+    bulk = BulkMatches(matches, *characters)
+    for tick in range(ticks):
+        inputs = np.array([[player(state, 0), enemy(state, 1)] for (player, enemy), state in zip(policies, states)])
+        for state, bits in zip(states, inputs.tolist()):
+            step(state, bits)
+        bulk.step(inputs)
+        for i, state in enumerate(states):
+            for side, column in ((0, i), (1, matches + i)):
+                expected = _fighter_fields(state.fighters[side])
+                got = _bulk_fields(bulk, column)
+                if expected != got:
+                    return f"tick {tick}, match {i}, side {side}: step {expected}, bulk {got}"
+        if bulk.done and all(state.game_over for state in states):
+            break
+    winners = [state.winner for state in states]
+    if bulk.winners() != winners:
+        return f"winners: step {winners}, bulk {bulk.winners()}"
+    return None
+
+
+# Plays a match in windows of `window` ticks; after each window it goes
+# back to the start of it and plays it again with the same inputs
+def check_snapshots(characters, window=8, seed=0):
+    rng = random.Random(seed)
+    policies = (ChasePolicy(rng), RandomPolicy(rng))
+    state = new_match(*characters)
+    start, played, replayed = state.new_state_buffer(), state.new_state_buffer(), state.new_state_buffer()
+    while not state.game_over:
+        state.save_state(start)
+        inputs = []
+        for _ in range(window):
+            inputs.append((policies[0](state, 0), policies[1](state, 1)))
+            step(state, inputs[-1])
+        state.save_state(played)
+        # Not in the snapshot, but derived from it
+        images = [(fighter.sprite_width, fighter.image) for fighter in state.fighters]
+
+        state.load_state(start)
+        for bits in inputs:
+            step(state, bits)
+        state.save_state(replayed)
+        if played != replayed:
+            return f"tick {state.tick}: state differs after load_state and {window} ticks"
+        if images != [(fighter.sprite_width, fighter.image) for fighter in state.fighters]:
+            return f"tick {state.tick}: sprite differs after load_state and {window} ticks"
+    return None
+
+
+def check_bulk_snapshots(characters, matches=16, window=8, ticks=1800, seed=0):
+    rng = np.random.default_rng(seed)
+    bulk = BulkMatches(matches, *characters)
+    for tick in range(0, ticks, window):
+        start = bulk.snapshot()
+        # Random buttons: bulk inputs don't have to come from a policy
+        inputs = rng.integers(0, 128, (window, matches, 2))
+        for bits in inputs:
+            bulk.step(bits)
+        played = bulk.snapshot()
+        bulk.restore(start)
+        for bits in inputs:
+            bulk.step(bits)
+        if not all(np.array_equal(a, b) for a, b in zip(played, bulk.snapshot())):
+            return f"tick {tick}: bulk state differs after restore and {window} ticks"
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that bulk matches and snapshots play the same game "
+                                                 "as simulation.step.")
+    parser.add_argument('--matches', type=int, default=16, help="matches played side by side in the bulk checks")
+    parser.add_argument('--ticks', type=int, default=3600, help="longest a bulk check runs")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    checks = (
+        ('bulk', lambda characters: check_bulk(characters, args.matches, args.ticks, args.seed)),
+        ('snapshots', lambda characters: check_snapshots(characters, seed=args.seed)),
+        ('bulk snapshots', lambda characters: check_bulk_snapshots(characters, args.matches, seed=args.seed)),
+    )
+    failed = 0
+    for characters in CASES:
+        for name, check in checks:
+            error = check(characters)
+            print(f"{name:<15} {' vs '.join(characters):<26} {'ok' if error is None else 'FAILED: ' + error}")
+            failed += error is not None
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+try:
+    import numpy as np
+except ImportError:
+    # Only the array code (integrate, Bodies) needs numpy; Stage, and with
+    # it the fighters' own physics, works without
+    np = None
+
+# Movement for everything that falls: each tick a body moves by its
+# velocity, is kept between the stage walls and either lands on the floor
+# (stops falling, gets its jumps back) or picks up gravity. Fighters do
+# this one at a time in Fighter.simulate; Bodies and integrate() run the
+# same rules over whole arrays for effects and bulk matches.
+
+
+# Where bodies are allowed: x is clamped to [left, right] and the bottom
+# of a body (y + height) rests on floor
+class Stage:
+    def __init__(self, left, right, floor):
+        self.left = left
+        self.right = right
+        self.floor = floor
+
+    def clamp_x(self, x):
+        return max(self.left, min(x, self.right))
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("physics.integrate and physics.Bodies need numpy")
+
+
+# One tick for arrays of bodies, in place. gravity, height and max_jumps
+# may be scalars or arrays. Returns which bodies are on the floor.
+def integrate(x, y, vx, vy, height, jumps, max_jumps, gravity, stage):
+    _require_numpy()
+    x += vx
+    y += vy
+    np.clip(x, stage.left, stage.right, out=x)
+    grounded = y + height >= stage.floor
+    vy += gravity
+    vy[grounded] = 0
+    np.copyto(y, stage.floor - height, where=grounded)
+    np.copyto(jumps, max_jumps, where=grounded)
+    return grounded
+
+
+# A pool of bodies for things there can be hundreds of (projectiles,
+# particles, debris). Slots are reused after remove(); the pool doubles
+# when it runs out.
+class Bodies:
+    FIELDS = ('x', 'y', 'vx', 'vy', 'height', 'jumps', 'max_jumps')
+
+    def __init__(self, stage, capacity=256):
+        _require_numpy()
+        self.stage = stage
+        self.capacity = 0
+        self.alive = np.zeros(0, dtype=bool)
+        # On the floor after the last integrate(); landed is the ones that
+        # just touched down
+        self.grounded = np.zeros(0, dtype=bool)
+        self.landed = np.zeros(0, dtype=bool)
+        for name in self.FIELDS:
+            setattr(self, name, np.zeros(0))
+        self.free = []
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        for name in self.FIELDS + ('alive', 'grounded', 'landed'):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros(extra, dtype=array.dtype)]))
+        self.slots = list(range(capacity))
+        # Lowest slots are handed out first
+        self.free = self.slots[self.capacity:][::-1] + self.free
+        self.capacity = capacity
+
+    def add(self, x, y, vx=0, vy=0, height=0, max_jumps=0):
+        if not self.free:
+            self.grow(self.capacity * 2)
+        index = self.free.pop()
+        self.x[index] = x
+        self.y[index] = y
+        self.vx[index] = vx
+        self.vy[index] = vy
+        self.height[index] = height
+        self.jumps[index] = max_jumps
+        self.max_jumps[index] = max_jumps
+        self.alive[index] = True
+        self.grounded[index] = False
+        self.landed[index] = False
+        return index
+
+    def remove(self, index):
+        if self.alive[index]:
+            self.alive[index] = False
+            self.free.append(index)
+
+    # remove() for every body where mask is set. Free slots are cleared
+    # from mask in place.
+    def remove_where(self, mask):
+        mask &= self.alive
+        self.alive[mask] = False
+        # Push the pool's own index objects, so the free list doesn't pick
+        # up new ints every tick
+        self.free.extend(map(self.slots.__getitem__, np.flatnonzero(mask).tolist()))
+
+    def clear(self):
+        self.alive[:] = False
+        self.free = self.slots[::-1]
+
+    def __len__(self):
+        return self.capacity - len(self.free)
+
+    def integrate(self, gravity):
+        # Free slots are integrated too; it's cheaper than masking them out
+        grounded = integrate(self.x, self.y, self.vx, self.vy, self.height,
+                             self.jumps, self.max_jumps, gravity, self.stage)
+        np.logical_and(grounded, ~self.grounded, out=self.landed)
+        self.landed &= self.alive
+        self.grounded = grounded
@@ -0,0 +1,98 @@
+import csv
+import time
+from array import array
+import pygame
+
+FRAME_BUDGET_MS = 1000 / 60
+
+
+# Per-phase frame timer. The main loop calls begin_frame(), then mark(phase)
+# after each phase, then end_frame(); timings go into fixed-size ring buffers.
+class FrameProfiler:
+    def __init__(self, phases, size=600):
+        self.phases = list(phases)
+        self.size = size
+        self.samples = {name: array('d', [0.0]) * size for name in self.phases + ['frame']}
+        self.current = dict.fromkeys(self.phases, 0.0)
+        self.index = 0
+        self.count = 0
+        self.frame_start = 0.0
+        self.last = 0.0
+        self.visible = False
+        self.stats = {}
+        self.panel = None
+
+    def begin_frame(self):
+        self.frame_start = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.current[phase] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        i = self.index
+        for name in self.phases:
+            self.samples[name][i] = self.current[name] * 1000
+            self.current[name] = 0.0
+        self.samples['frame'][i] = (self.last - self.frame_start) * 1000
+        self.index = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        # Percentiles are only refreshed twice a second so the overlay stays cheap
+        if self.count % 30 == 0 or not self.stats:
+            self.stats = {name: self.percentiles(name) for name in self.samples}
+
+    def ordered(self, name):
+        # Samples from oldest to newest
+        buf = self.samples[name]
+        if self.count < self.size:
+            return buf[:self.count]
+        return buf[self.index:] + buf[:self.index]
+
+    def percentiles(self, name, qs=(50, 95, 99)):
+        values = sorted(self.ordered(name))
+        if not values:
+            return dict.fromkeys(qs, 0.0)
+        return {q: values[min(len(values) - 1, len(values) * q // 100)] for q in qs}
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def draw(self, surface, font, x=10, y=None, width=300, height=120):
+        if not self.visible:
+            return None
+        if y is None:
+            y = surface.get_height() - height - 10
+        if self.panel is None or self.panel.get_size() != (width, height):
+            self.panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.panel.fill((0, 0, 0, 160))
+        surface.blit(self.panel, (x, y))
+
+        # Bar per frame, scaled so two frame budgets fill the panel
+        graph_top = y + 40
+        graph_height = height - 40
+        scale = graph_height / (FRAME_BUDGET_MS * 2)
+        recent = self.ordered('frame')[-width:]
+        for i, ms in enumerate(recent):
+            bar = min(graph_height, int(ms * scale))
+            color = (0, 200, 0) if ms <= FRAME_BUDGET_MS else (220, 40, 40)
+            pygame.draw.line(surface, color, (x + i, y + height), (x + i, y + height - bar))
+        budget_y = y + height - int(FRAME_BUDGET_MS * scale)
+        pygame.draw.line(surface, (255, 255, 0), (x, budget_y), (x + width, budget_y))
+
+        frame = self.stats.get('frame', {})
+        text = "frame p50 %.1f  p95 %.1f  p99 %.1f ms" % (frame.get(50, 0), frame.get(95, 0), frame.get(99, 0))
+        surface.blit(font.render(text, True, (255, 255, 255)), (x + 4, y + 2))
+        slowest = max(self.phases, key=lambda name: self.stats.get(name, {}).get(95, 0))
+        text = "slowest p95: %s %.2f ms" % (slowest, self.stats.get(slowest, {}).get(95, 0))
+        surface.blit(font.render(text, True, (255, 255, 255)), (x + 4, graph_top - 18))
+        return pygame.Rect(x, y, width, height)
+
+    def dump_csv(self, path):
+        columns = self.phases + ['frame']
+        rows = zip(*(self.ordered(name) for name in columns))
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['sample'] + [name + '_ms' for name in columns])
+            for i, row in enumerate(rows):
+                writer.writerow([i] + ['%.4f' % ms for ms in row])
@@ -0,0 +1,135 @@
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import json
+import struct
+
+from physics import Stage
+from simulation import TICK_RATE, new_match, step
+
+# Replay file layout (little endian):
+#   header: magic, format version, RNG seed, config length, then the config as JSON
+#   body:   runs of (repeat count, player bits, enemy bits), one run per change in input
+MAGIC = b'FGRP'
+VERSION = 1
+HEADER = struct.Struct('<4sBIH')
+RUN = struct.Struct('<HBB')
+MAX_RUN = 0xFFFF
+
+
+def match_config(state):
+    return {
+        'tick_rate': TICK_RATE,
+        'gravity': state.gravity,
+        'stage': [state.stage.left, state.stage.right, state.stage.floor],
+        'turn_around': state.turn_around,
+        'characters': [fighter.name for fighter in state.fighters],
+    }
+
+
+def apply_config(state, config):
+    if config.get('tick_rate', TICK_RATE) != TICK_RATE:
+        raise ValueError(f"replay was recorded at {config['tick_rate']} ticks/s, simulation runs at {TICK_RATE}")
+    state.gravity = config.get('gravity', state.gravity)
+    if 'stage' in config:
+        state.stage = Stage(*config['stage'])
+    # Older recordings come from before fighters could turn around
+    state.turn_around = config.get('turn_around', False)
+
+
+# Writes the per-tick input bitmasks of both fighters, run-length encoded
+class InputRecorder:
+    def __init__(self, path, seed=0, config=None):
+        self.file = open(path, 'wb')
+        config_bytes = json.dumps(config or {}).encode('utf-8')
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, len(config_bytes)))
+        self.file.write(config_bytes)
+        self.run_bits = None
+        self.run_length = 0
+        self.ticks = 0
+
+    def record(self, inputs):
+        bits = tuple(inputs)
+        if bits == self.run_bits and self.run_length < MAX_RUN:
+            self.run_length += 1
+        else:
+            self.flush_run()
+            self.run_bits = bits
+            self.run_length = 1
+        self.ticks += 1
+
+    def flush_run(self):
+        if self.run_length:
+            self.file.write(RUN.pack(self.run_length, *self.run_bits))
+        self.run_length = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush_run()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Reads a replay file back as one (player bits, enemy bits) tuple per tick
+class InputReplay:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        magic, version, self.seed, config_length = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        if version != VERSION:
+            raise ValueError(f"unsupported replay version {version}")
+
+        offset = HEADER.size
+        self.config = json.loads(data[offset:offset + config_length].decode('utf-8'))
+        offset += config_length
+        self.runs = [RUN.unpack_from(data, pos) for pos in range(offset, len(data), RUN.size)]
+        self.ticks = sum(run[0] for run in self.runs)
+
+    def __len__(self):
+        return self.ticks
+
+    def __iter__(self):
+        for length, player_bits, enemy_bits in self.runs:
+            bits = (player_bits, enemy_bits)
+            for _ in range(length):
+                yield bits
+
+
+# Re-simulate a recorded match as fast as possible, without rendering
+def replay_match(path):
+    replay = InputReplay(path)
+    state = new_match(*replay.config.get('characters', ()))
+    apply_config(state, replay.config)
+    for inputs in replay:
+        step(state, inputs)
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-simulate a recorded match headlessly.")
+    parser.add_argument('replay')
+    args = parser.parse_args(argv)
+
+    state = replay_match(args.replay)
+    player, enemy = state.fighters
+    print(json.dumps({
+        'ticks': state.tick,
+        'winner': state.winner,
+        'player_hp': player.health_comp.current_hp,
+        'enemy_hp': enemy.health_comp.current_hp,
+        'player_hits': state.hits[0],
+        'enemy_hits': state.hits[1],
+    }))
+
+
+if __name__ == '__main__':
+    main()
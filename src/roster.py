@@ -0,0 +1,220 @@
+import json
+import os
+import pickle
+from classes import Fighter
+from animation import default_events
+
+# Characters are defined in assets/characters/*.json. They are validated and
+# compiled once into a pickle next to them; the pickle is rebuilt whenever a
+# character file is added, removed or modified.
+ROSTER_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'characters'))
+CACHE_NAME = 'roster.cache'
+CACHE_VERSION = 4
+
+# Which way a character's sheets face, from the optional "facing" key
+FACINGS = {'right': 1, 'left': -1}
+# Tint for the enemy when both sides pick the same character
+MIRROR_TINT = (150, 170, 255)
+
+# Where each side of the screen starts
+SLOTS = (
+    {'position': (0, 0), 'velocity': (0, 0), 'color': 'red'},
+    {'position': (400, 100), 'velocity': (0, 0), 'color': 'blue'},
+)
+
+_roster = None
+
+
+def _require(data, key, path, kind=None):
+    if key not in data:
+        raise ValueError(f"{path}: missing '{key}'")
+    value = data[key]
+    if kind is not None and not isinstance(value, kind):
+        raise ValueError(f"{path}: '{key}' should be {kind.__name__}")
+    return value
+
+
+def _compile_sprites(entries, base_dir, path, default_image=None):
+    sprites = {}
+    for name, entry in entries.items():
+        image = entry.get('image', default_image)
+        if image is None:
+            raise ValueError(f"{path}: sprite '{name}' has no image")
+        image_path = os.path.normpath(os.path.join(base_dir, image))
+        if not os.path.isfile(image_path):
+            raise ValueError(f"{path}: sprite '{name}' image {image_path} does not exist")
+        frames_max = _require(entry, 'framesMax', path, int)
+        if frames_max < 1:
+            raise ValueError(f"{path}: sprite '{name}' framesMax must be at least 1")
+        sprites[name] = {'imageSrc': image_path, 'framesMax': frames_max}
+    return sprites
+
+
+def _compile_boxes(entries, sprites, path, kind):
+    # {animation: [[x, y, w, h], ...]} applies to every frame of the animation,
+    # {animation: {"frame": [[x, y, w, h], ...]}} only to the listed frames
+    tables = {}
+    for name, spec in entries.items():
+        if name not in sprites:
+            raise ValueError(f"{path}: {kind} for unknown sprite '{name}'")
+        frames_max = sprites[name]['framesMax']
+        if isinstance(spec, list):
+            spec = {str(i): spec for i in range(frames_max)}
+        table = [None] * frames_max
+        for frame, boxes in spec.items():
+            if not frame.isdigit() or int(frame) >= frames_max:
+                raise ValueError(f"{path}: {kind} '{name}' has no frame {frame}")
+            if any(len(box) != 4 for box in boxes):
+                raise ValueError(f"{path}: {kind} '{name}' boxes must be [x, y, width, height]")
+            table[int(frame)] = tuple(tuple(box) for box in boxes)
+        tables[name] = table
+    return tables
+
+
+def _compile_events(entries, sprites, hit_frame, path):
+    # {animation: {"frame": "event"}}; attack1 hits on hitFrame unless the
+    # file lists attack1's events itself
+    if 'attack1' in sprites and hit_frame >= sprites['attack1']['framesMax']:
+        raise ValueError(f"{path}: hitFrame {hit_frame} is past the end of attack1")
+    events = default_events(hit_frame)
+    for name, frames in entries.items():
+        if name not in sprites:
+            raise ValueError(f"{path}: events for unknown sprite '{name}'")
+        table = {}
+        for frame, event in frames.items():
+            if not frame.isdigit() or int(frame) >= sprites[name]['framesMax']:
+                raise ValueError(f"{path}: events '{name}' has no frame {frame}")
+            table[int(frame)] = event
+        events[name] = table
+    return events
+
+
+def compile_character(path):
+    with open(path) as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(path)
+
+    sprites = _compile_sprites(_require(data, 'sprites', path, dict), base_dir, path)
+    if 'idle' not in sprites:
+        raise ValueError(f"{path}: characters need an 'idle' sprite")
+
+    attack_box = _require(data, 'attackBox', path, dict)
+    hit_frame = _require(data, 'hitFrame', path, int)
+    facing = data.get('facing', 'right')
+    if facing not in FACINGS:
+        raise ValueError(f"{path}: 'facing' should be 'left' or 'right'")
+    profiles = {}
+    for name, profile in _require(data, 'profiles', path, dict).items():
+        if 'sprites' in profile:
+            profile_sprites = _compile_sprites(profile['sprites'], base_dir, path, profile.get('image'))
+        else:
+            # Profiles without their own sprites reuse the character's
+            profile_sprites = sprites
+        profiles[name] = {'damage': _require(profile, 'damage', path, int), 'sprites': profile_sprites}
+    if 'base' not in profiles:
+        raise ValueError(f"{path}: characters need a 'base' profile")
+
+    return {
+        'name': data.get('name', os.path.splitext(os.path.basename(path))[0]),
+        'scale': _require(data, 'scale', path, (int, float)),
+        'offset': tuple(_require(data, 'offset', path, list)),
+        'facing': FACINGS[facing],
+        'hit_frame': hit_frame,
+        'events': _compile_events(data.get('events', {}), sprites, hit_frame, path),
+        'attack_box': {
+            'offset': tuple(attack_box.get('offset', (0, 0))),
+            'width': attack_box.get('width', 0),
+            'height': attack_box.get('height', 0),
+        },
+        'hitboxes': _compile_boxes(data.get('hitboxes', {}), sprites, path, 'hitboxes'),
+        'hurtboxes': _compile_boxes(data.get('hurtboxes', {}), sprites, path, 'hurtboxes'),
+        'sprites': sprites,
+        'profiles': profiles,
+    }
+
+
+def _source_mtimes(directory):
+    return {
+        name: os.stat(os.path.join(directory, name)).st_mtime_ns
+        for name in sorted(os.listdir(directory))
+        if name.endswith('.json')
+    }
+
+
+def load_roster(directory=ROSTER_DIR):
+    mtimes = _source_mtimes(directory)
+    cache_path = os.path.join(directory, CACHE_NAME)
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached['version'] == CACHE_VERSION and cached['directory'] == directory and cached['mtimes'] == mtimes:
+            return cached['characters']
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+        pass
+
+    characters = {}
+    for name in mtimes:
+        character = compile_character(os.path.join(directory, name))
+        characters[character['name']] = character
+
+    try:
+        with open(cache_path, 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'directory': directory, 'mtimes': mtimes,
+                         'characters': characters}, f, pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # A read-only install still works, it just compiles on every start
+        pass
+    return characters
+
+
+def get_roster():
+    # Loaded once per process; restarts reuse the compiled roster
+    global _roster
+    if _roster is None:
+        _roster = load_roster()
+    return _roster
+
+
+def _copy_sprites(sprites):
+    # Fighter.load_sprites() stores surfaces in the dicts, so each fighter gets its own
+    return {name: dict(sprite) for name, sprite in sprites.items()}
+
+
+def create_fighter(character_name, slot, tint=None):
+    roster = get_roster()
+    if character_name not in roster:
+        raise ValueError(f"unknown character '{character_name}' (available: {', '.join(sorted(roster))})")
+    character = roster[character_name]
+    idle = character['sprites']['idle']
+
+    fighter = Fighter(
+        position=slot['position'],
+        velocity=slot['velocity'],
+        color=slot['color'],
+        image_path=idle['imageSrc'],
+        frames_max=idle['framesMax'],
+        scale=character['scale'],
+        offset=character['offset'],
+        sprites=_copy_sprites(character['sprites']),
+        attack_box=character['attack_box'],
+        character_profiles={
+            name: {'damage': profile['damage'], 'sprites': _copy_sprites(profile['sprites'])}
+            for name, profile in character['profiles'].items()
+        },
+        name=character['name'],
+        hit_frame=character['hit_frame'],
+        hitboxes=character['hitboxes'],
+        hurtboxes=character['hurtboxes'],
+        events=character['events'],
+        facing=character['facing'],
+        tint=tint,
+    )
+    fighter.base_damage = fighter.damage = character['profiles']['base']['damage']
+    return fighter
+
+
+def create_fighters(player_character='samuraiMack', enemy_character='kenji'):
+    p = create_fighter(player_character, SLOTS[0])
+    # A mirror match needs some way to tell the two apart
+    e = create_fighter(enemy_character, SLOTS[1], MIRROR_TINT if enemy_character == player_character else None)
+    return p, e
@@ -0,0 +1,440 @@
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import queue
+import random
+import secrets
+import socket
+import struct
+import sys
+import time
+
+from controls import LEFT, RIGHT, PRESS_LEFT, PRESS_RIGHT
+from profiler import FrameProfiler
+from simulation import TICK_RATE, new_match, step
+from spectate import LENGTH, KIND, SpectatorServer, encode_hello, state_fields
+import ai
+
+# Match server for arcade networks. One process runs many arenas (a match
+# each) on a single fixed-tick loop; --workers shards the arenas over
+# several processes, each with its own port (port + shard).
+#
+#   python server.py --arenas 40 --port 7200
+#
+# Clients connect over TCP to the shard hosting their arena and send
+# length-prefixed messages, like the spectate.py stream:
+#   join:   kind, arena, side (0 or 1 to play, -1 to watch)
+#   input:  kind, controls bits
+# They get the spectate.py stream back: a hello with the arena config
+# (plus their side, and for players a token), a keyframe, then deltas. On
+# a failed join the hello is {"error": ...} and the server hangs up.
+#
+# Once joined, a player can also send input as UDP datagrams to the same
+# port: magic, arena, side, token, sequence number, bits. Datagrams with
+# the wrong token (an old join, or someone else) or that arrive after a
+# newer one are dropped; clients send them once they have the hello.
+# Pressing a direction is inferred from it starting to be held, so a lost
+# datagram doesn't leave a fighter standing still with the key down.
+#
+# spectate.py --arena N [--side 0|1] is a client for this: it joins,
+# draws the stream and sends the keyboard as input messages.
+#
+# Arenas with nobody playing are paused. An empty side is played by the
+# --cpu policy, and --demo keeps every arena playing CPU vs CPU.
+JOIN, INPUT = range(2)
+JOIN_BODY = struct.Struct('<BHb')
+INPUT_BODY = struct.Struct('<BB')
+MAGIC = b'FA'
+DATAGRAM = struct.Struct('<2sHbIIB')
+
+WATCH = -1
+MAX_VIEWERS = 64
+SEND_BUFFER = 16 * 1024
+JOIN_TIMEOUT = 5.0
+# Finished matches stay on screen this long before the arena restarts
+RESTART_TICKS = 5 * TICK_RATE
+# A shard this many ticks behind stops trying to catch up and lets the
+# clock slip, instead of running a burst of ticks
+MAX_LAG_TICKS = 6
+# Share of each tick one shard should spend simulating; more arenas than
+# that go to another worker
+LOAD_TARGET = 0.5
+METRICS_INTERVAL = 5.0
+
+
+def encode_join(arena, side):
+    return LENGTH.pack(JOIN_BODY.size) + JOIN_BODY.pack(JOIN, arena, side)
+
+
+def encode_input(bits):
+    return LENGTH.pack(INPUT_BODY.size) + INPUT_BODY.pack(INPUT, bits)
+
+
+# Input from a network player, merged the way KeyboardInput merges key
+# events: held directions follow the latest message, presses are kept
+# until the next tick uses them
+class RemoteInput:
+    def __init__(self):
+        self.held = 0
+        self.pressed = 0
+        self.sequence = -1
+
+    def receive(self, bits):
+        held = bits & (LEFT | RIGHT)
+        # A direction that wasn't held before was pressed, whether or not
+        # the message saying so arrived
+        if held & ~self.held & LEFT:
+            bits |= PRESS_LEFT
+        elif held & ~self.held & RIGHT:
+            bits |= PRESS_RIGHT
+        self.held = held
+        if bits & (PRESS_LEFT | PRESS_RIGHT):
+            # Only the most recent direction press counts
+            self.pressed &= ~(PRESS_LEFT | PRESS_RIGHT)
+        self.pressed |= bits & ~(LEFT | RIGHT)
+
+    def poll(self):
+        bits = self.held | self.pressed
+        self.pressed = 0
+        return bits
+
+    def reset(self):
+        self.held = 0
+        self.pressed = 0
+        self.sequence = -1
+
+
+# One match and everyone connected to it. The state goes out through a
+# SpectatorServer that never listens itself; the shard hands it the
+# sockets, and it skips frames for clients that can't keep up.
+class Arena:
+    def __init__(self, arena_id, characters=('samuraiMack', 'kenji'), cpu=None, seed=0, demo=False):
+        self.id = arena_id
+        self.state = new_match(*characters)
+        self.initial_state = self.state.save_state(self.state.new_state_buffer())
+        self.config = {'arena': arena_id, 'characters': list(characters), 'tick_rate': TICK_RATE}
+        self.stream = SpectatorServer(self.config)
+        # Token of the player on each side, None when it's free
+        self.players = [None, None]
+        self.inputs = (RemoteInput(), RemoteInput())
+        rng = random.Random(seed)
+        self.cpu = tuple(ai.POLICIES[cpu](rng) for _ in range(2)) if cpu else None
+        self.demo = demo
+        self.profiler = FrameProfiler(('inputs', 'step', 'broadcast'))
+        self.ticks = 0
+        self.matches = 1
+
+    @property
+    def active(self):
+        return self.demo or self.players[0] is not None or self.players[1] is not None
+
+    def restart(self):
+        self.state.load_state(self.initial_state)
+        for remote in self.inputs:
+            remote.pressed = 0
+        self.matches += 1
+
+    # Seats a player and returns the token its UDP input has to carry
+    def join(self, side):
+        if not self.active and self.state.tick:
+            # Nobody was here; start fresh rather than where the last match stopped
+            self.restart()
+        token = secrets.randbits(32)
+        self.players[side] = token
+        self.inputs[side].reset()
+        return token
+
+    def leave(self, side):
+        self.players[side] = None
+        self.inputs[side].reset()
+
+    def input_bits(self, index):
+        if self.players[index] is not None:
+            return self.inputs[index].poll()
+        if self.cpu:
+            return self.cpu[index](self.state, index)
+        return 0
+
+    def tick(self):
+        if not self.active:
+            return
+        profiler = self.profiler
+        profiler.begin_frame()
+        state = self.state
+        if state.game_over and state.tick - state.game_over_tick >= RESTART_TICKS:
+            self.restart()
+        inputs = (self.input_bits(0), self.input_bits(1))
+        profiler.mark('inputs')
+        step(state, inputs)
+        profiler.mark('step')
+        self.stream.broadcast(state.tick, state_fields(state))
+        profiler.mark('broadcast')
+        profiler.end_frame()
+        self.ticks += 1
+
+    def metrics(self):
+        frame = self.profiler.percentiles('frame', (50, 99))
+        return {
+            'arena': self.id,
+            'active': self.active,
+            'ticks': self.ticks,
+            'matches': self.matches,
+            'players': sum(1 for token in self.players if token is not None),
+            'clients': len(self.stream.viewers),
+            'tick_ms_p50': round(frame[50], 3),
+            'tick_ms_p99': round(frame[99], 3),
+            'tick_ms_max': round(max(self.profiler.ordered('frame'), default=0.0), 3),
+            'skipped_frames': self.stream.skipped,
+        }
+
+
+class _InputProtocol(asyncio.DatagramProtocol):
+    def __init__(self, shard):
+        self.shard = shard
+
+    def datagram_received(self, data, addr):
+        self.shard.receive_datagram(data, addr)
+
+    def error_received(self, exc):
+        pass
+
+
+async def read_message(reader):
+    (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    return await reader.readexactly(length)
+
+
+# The arenas of one worker process, their sockets and the tick loop
+class Shard:
+    def __init__(self, index, arenas, ports):
+        self.index = index
+        self.arenas = {arena.id: arena for arena in arenas}
+        # Port of every arena on the server, to point misdirected clients at
+        # the right shard
+        self.ports = ports
+        self.ticks = 0
+        self.busy = 0.0
+        self.late_ticks = 0
+        self.dropped_ticks = 0
+        self.dropped_datagrams = 0
+        self.server = None
+        self.transport = None
+
+    async def start(self, host, port):
+        loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.on_connect, host, port, backlog=1024)
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: _InputProtocol(self), local_addr=(host, port))
+
+    def refuse(self, writer, error, **details):
+        writer.write(encode_hello(dict(details, error=error)))
+        writer.close()
+
+    async def on_connect(self, reader, writer):
+        try:
+            body = await asyncio.wait_for(read_message(reader), JOIN_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        if len(body) != JOIN_BODY.size or KIND.unpack_from(body)[0] != JOIN:
+            return self.refuse(writer, "expected a join message")
+        _, arena_id, side = JOIN_BODY.unpack(body)
+        arena = self.arenas.get(arena_id)
+        if arena is None:
+            if arena_id in self.ports:
+                return self.refuse(writer, f"arena {arena_id} is on another port", port=self.ports[arena_id])
+            return self.refuse(writer, f"no arena {arena_id}")
+        if side not in (WATCH, 0, 1):
+            return self.refuse(writer, f"no side {side}")
+        if side != WATCH and arena.players[side] is not None:
+            return self.refuse(writer, f"side {side} of arena {arena_id} is taken")
+        if len(arena.stream.viewers) >= MAX_VIEWERS:
+            return self.refuse(writer, f"arena {arena_id} is full")
+
+        # A small kernel buffer keeps memory per client bounded, and makes a
+        # stalled client show up in the write buffer (and get frames skipped)
+        # after seconds instead of minutes
+        writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        hello = dict(arena.config, side=side)
+        if side != WATCH:
+            hello['token'] = arena.join(side)
+        viewer = arena.stream.add_viewer(writer, encode_hello(hello))
+        try:
+            while True:
+                body = await read_message(reader)
+                if side != WATCH and len(body) == INPUT_BODY.size and body[0] == INPUT:
+                    arena.inputs[side].receive(body[1])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            arena.stream.viewers.discard(viewer)
+            if side != WATCH:
+                arena.leave(side)
+            writer.close()
+
+    def receive_datagram(self, data, addr):
+        if len(data) != DATAGRAM.size:
+            return
+        magic, arena_id, side, token, sequence, bits = DATAGRAM.unpack(data)
+        arena = self.arenas.get(arena_id)
+        # Only from the client that joined that side over TCP
+        if magic != MAGIC or arena is None or side not in (0, 1) or arena.players[side] != token:
+            return
+        remote = arena.inputs[side]
+        if sequence <= remote.sequence:
+            self.dropped_datagrams += 1
+            return
+        remote.sequence = sequence
+        remote.receive(bits)
+
+    def tick(self):
+        started = time.perf_counter()
+        for arena in self.arenas.values():
+            arena.tick()
+        self.busy += time.perf_counter() - started
+        self.ticks += 1
+
+    def metrics(self, elapsed):
+        return {
+            'shard': self.index,
+            'ticks': self.ticks,
+            # Share of the wall clock spent simulating since the last report
+            'load': round(self.busy / elapsed, 3) if elapsed else 0.0,
+            'late_ticks': self.late_ticks,
+            'dropped_ticks': self.dropped_ticks,
+            'dropped_datagrams': self.dropped_datagrams,
+            'arenas': [arena.metrics() for arena in self.arenas.values()],
+        }
+
+    # Ticks every arena TICK_RATE times a second until stop is set,
+    # putting a metrics report on the queue every report_interval seconds
+    async def run(self, stop, reports=None, report_interval=METRICS_INTERVAL):
+        loop = asyncio.get_running_loop()
+        interval = 1 / TICK_RATE
+        next_time = loop.time()
+        last_report = next_time
+        while not stop.is_set():
+            self.tick()
+            next_time += interval
+            now = loop.time()
+            if now - next_time > MAX_LAG_TICKS * interval:
+                self.dropped_ticks += int((now - next_time) / interval)
+                next_time = now
+            elif now > next_time:
+                self.late_ticks += 1
+            if reports is not None and now - last_report >= report_interval:
+                reports.put(self.metrics(now - last_report))
+                self.busy = 0.0
+                last_report = now
+            await asyncio.sleep(max(0.0, next_time - now))
+
+    async def close(self):
+        self.server.close()
+        self.transport.close()
+        for arena in self.arenas.values():
+            await arena.stream.close()
+
+
+def run_shard(index, arena_ids, ports, args, stop, reports):
+    arenas = [Arena(arena_id, (args.player_character, args.enemy_character), args.cpu,
+                    args.seed + arena_id, args.demo)
+              for arena_id in arena_ids]
+    shard = Shard(index, arenas, ports)
+
+    async def serve():
+        await shard.start(args.host, ports[arena_ids[0]])
+        try:
+            await shard.run(stop, reports, args.metrics_interval)
+        finally:
+            await shard.close()
+    asyncio.run(serve())
+
+
+# Seconds one arena takes per tick on this machine, CPU players included
+def arena_cost(characters, cpu, ticks=600):
+    arena = Arena(0, characters, cpu, demo=True)
+    started = time.perf_counter()
+    for _ in range(ticks):
+        arena.tick()
+    return (time.perf_counter() - started) / ticks
+
+
+# Splits arena ids into blocks, one per worker. Without a worker count,
+# a worker is only added once the ones before it would be over LOAD_TARGET.
+def plan_shards(arenas, cost, workers=None):
+    per_worker = max(1, int(LOAD_TARGET / TICK_RATE / cost))
+    if workers is None:
+        workers = min(os.cpu_count() or 1, math.ceil(arenas / per_worker))
+    workers = max(1, min(workers, arenas))
+    size = math.ceil(arenas / workers)
+    return [list(range(start, min(arenas, start + size))) for start in range(0, arenas, size)], per_worker
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Host many matches for networked cabinets.")
+    parser.add_argument('--arenas', type=int, default=16)
+    parser.add_argument('--workers', type=int, help="worker processes (default: as many as the load needs)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7200, help="TCP/UDP port of the first worker; the next ones count up")
+    parser.add_argument('--cpu', choices=sorted(ai.POLICIES), default='utility',
+                        help="policy playing the empty side of an arena")
+    parser.add_argument('--no-cpu', dest='cpu', action='store_const', const=None, help="leave empty sides idle")
+    parser.add_argument('--demo', action='store_true', help="keep every arena playing, CPU vs CPU, for load tests")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--player-character', default='samuraiMack')
+    parser.add_argument('--enemy-character', default='kenji')
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--metrics', default='-', help="where to write the metrics reports, as JSON lines")
+    parser.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    characters = (args.player_character, args.enemy_character)
+    cost = arena_cost(characters, args.cpu)
+    plan, per_worker = plan_shards(args.arenas, cost, args.workers)
+    ports = {arena_id: args.port + index for index, arena_ids in enumerate(plan) for arena_id in arena_ids}
+    print(f"{cost * 1000:.3f} ms per arena tick, {per_worker} arenas per worker", file=sys.stderr)
+    if args.workers is None and args.arenas > per_worker * len(plan):
+        print(f"warning: {args.arenas} arenas is more than {len(plan)} cores can tick in time", file=sys.stderr)
+    for index, arena_ids in enumerate(plan):
+        print(f"worker {index}: arenas {arena_ids[0]}-{arena_ids[-1]} on {args.host}:{args.port + index}",
+              file=sys.stderr)
+
+    stop = multiprocessing.Event()
+    reports = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_shard, args=(index, arena_ids, ports, args, stop, reports))
+               for index, arena_ids in enumerate(plan)]
+    for worker in workers:
+        worker.start()
+
+    out = open(args.metrics, 'w') if args.metrics != '-' else sys.stdout
+    started = time.perf_counter()
+    try:
+        while all(worker.is_alive() for worker in workers):
+            if args.duration is not None and time.perf_counter() - started >= args.duration:
+                break
+            try:
+                report = reports.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            report['time'] = round(time.perf_counter() - started, 1)
+            out.write(json.dumps(report) + '\n')
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+from array import array
+from controls import LEFT, RIGHT, PRESS_LEFT, PRESS_RIGHT, JUMP, ATTACK, TRANSFORM
+from animation import IDLE, RUN, JUMP_ANIM, FALL, DEATH
+from roster import create_fighters
+from utils import winner_text
+from collision import find_hits, hitboxes, attack_window_over
+from physics import Stage
+
+# The simulation advances in fixed ticks; nothing here reads the wall clock
+# or touches a display, so matches can run headless as fast as the CPU allows.
+TICK_RATE = 60
+ROUND_TICKS = 60 * TICK_RATE
+WIDTH, HEIGHT = 1024, 576
+GRAVITY = 1.5
+RUN_SPEED = 5
+JUMP_VELOCITY = -30
+# Fighters stay between these walls and land on this floor
+STAGE = Stage(0, 950, HEIGHT - 40)
+
+# MatchState.winner values by number, for save_state()
+WINNERS = (None, "Tie", "Player 1 Wins", "Player 2 Wins")
+
+
+class MatchState:
+    __slots__ = ('player', 'enemy', 'fighters', 'last_keys', 'gravity', 'stage', 'turn_around', 'hits',
+                 'tick', 'game_over', 'game_over_tick', 'winner')
+
+    def __init__(self, player, enemy, stage=STAGE):
+        self.player = player
+        self.enemy = enemy
+        self.fighters = (player, enemy)
+        # Direction each fighter pressed last (LEFT, RIGHT or 0)
+        self.last_keys = [0, 0]
+        self.gravity = GRAVITY
+        self.stage = stage
+        # Fighters turn to face each other when they cross (off for replays
+        # recorded before fighters could turn)
+        self.turn_around = True
+        # Successful hits landed by each fighter
+        self.hits = [0, 0]
+        self.tick = 0
+        self.game_over = False
+        self.game_over_tick = None
+        self.winner = None
+
+    # --- Rollback support ---
+    # The whole match (both fighters included) fits in one flat buffer; allocate
+    # it once with new_state_buffer() and reuse it every tick.
+    MATCH_FIELDS = 9
+
+    def state_size(self):
+        return self.MATCH_FIELDS + sum(f.STATE_SIZE for f in self.fighters)
+
+    def new_state_buffer(self):
+        return array('d', bytes(8 * self.state_size()))
+
+    def save_state(self, buf):
+        buf[0] = self.tick
+        buf[1] = self.game_over
+        buf[2] = -1 if self.game_over_tick is None else self.game_over_tick
+        buf[3] = WINNERS.index(self.winner)
+        buf[4], buf[5] = self.last_keys
+        buf[6], buf[7] = self.hits
+        buf[8] = self.gravity
+        offset = self.MATCH_FIELDS
+        for fighter in self.fighters:
+            offset = fighter.save_state(buf, offset)
+        return buf
+
+    def load_state(self, buf):
+        self.tick = int(buf[0])
+        self.game_over = bool(buf[1])
+        self.game_over_tick = None if buf[2] < 0 else int(buf[2])
+        self.winner = WINNERS[int(buf[3])]
+        self.last_keys[0] = int(buf[4])
+        self.last_keys[1] = int(buf[5])
+        self.hits[0] = int(buf[6])
+        self.hits[1] = int(buf[7])
+        self.gravity = buf[8]
+        offset = self.MATCH_FIELDS
+        for fighter in self.fighters:
+            offset = fighter.load_state(buf, offset)
+
+
+def new_match(player_character='samuraiMack', enemy_character='kenji'):
+    player, enemy = create_fighters(player_character, enemy_character)
+    return MatchState(player, enemy)
+
+
+def remaining_seconds(state):
+    return max(0, (ROUND_TICKS - state.tick) // TICK_RATE)
+
+
+def apply_input(state, index, bits):
+    fighter = state.fighters[index]
+    if fighter.dead:
+        return
+
+    if bits & PRESS_LEFT:
+        state.last_keys[index] = LEFT
+    elif bits & PRESS_RIGHT:
+        state.last_keys[index] = RIGHT
+
+    if bits & JUMP and fighter.jumps_left > 0:
+        fighter.velocity.y = JUMP_VELOCITY
+        fighter.jumps_left -= 1
+    if bits & ATTACK:
+        fighter.attack()
+    if bits & TRANSFORM:
+        fighter.transform()
+
+
+def update_movement(state, index, bits):
+    fighter = state.fighters[index]
+    fighter.velocity.x = 0
+    if fighter.dead:
+        return
+
+    last_key = state.last_keys[index]
+    if bits & LEFT and last_key == LEFT:
+        fighter.velocity.x = -RUN_SPEED
+        fighter.switch_animation(RUN)
+    elif bits & RIGHT and last_key == RIGHT:
+        fighter.velocity.x = RUN_SPEED
+        fighter.switch_animation(RUN)
+    else:
+        fighter.switch_animation(IDLE)
+
+    if fighter.velocity.y < 0:
+        fighter.switch_animation(JUMP_ANIM)
+    elif fighter.velocity.y > 0:
+        fighter.switch_animation(FALL)
+
+
+def update_facing(state):
+    # Face the opponent, except in the middle of a swing
+    for fighter, other in ((state.player, state.enemy), (state.enemy, state.player)):
+        if fighter.dead or fighter.is_attacking:
+            continue
+        dx = (other.position.x + other.mirror_axis) - (fighter.position.x + fighter.mirror_axis)
+        if dx > 0:
+            fighter.facing = 1
+        elif dx < 0:
+            fighter.facing = -1
+
+
+def resolve_attacks(state):
+    fighters = state.fighters
+    landed = set()
+    for attacker_index, target_index in sorted(find_hits(fighters)):
+        attacker = fighters[attacker_index]
+        # An earlier hit this tick may have knocked the attacker out of its hit frame
+        if not hitboxes(attacker):
+            continue
+        fighters[target_index].take_hit(attacker.damage)
+        state.hits[attacker_index] += 1
+        landed.add(attacker_index)
+
+    for index, fighter in enumerate(fighters):
+        if fighter.is_attacking and (index in landed or attack_window_over(fighter)):
+            fighter.is_attacking = False
+
+
+def end_match(state):
+    state.game_over = True
+    state.game_over_tick = state.tick
+    state.winner = winner_text(state.player, state.enemy)
+
+
+# Advance the match by one tick. inputs holds one controls bitmask per
+# fighter; the state is updated in place and returned.
+def step(state, inputs):
+    player, enemy = state.player, state.enemy
+    state.tick += 1
+    # Effect events from this tick are stamped with it, see effects.py
+    player.effect_tick = enemy.effect_tick = state.tick
+
+    for index, bits in enumerate(inputs):
+        apply_input(state, index, bits)
+
+    for fighter in state.fighters:
+        fighter.simulate(state.gravity, state.stage)
+
+    for index, bits in enumerate(inputs):
+        update_movement(state, index, bits)
+
+    if state.turn_around:
+        update_facing(state)
+
+    resolve_attacks(state)
+
+    if enemy.health_comp.current_hp <= 0 and not enemy.dead:
+        enemy.switch_animation(DEATH)
+    elif player.health_comp.current_hp <= 0 and not player.dead:
+        player.switch_animation(DEATH)
+
+    if (enemy.health_comp.current_hp <= 0 or player.health_comp.current_hp <= 0) and not state.game_over:
+        end_match(state)
+
+    if remaining_seconds(state) == 0 and not state.game_over:
+        end_match(state)
+
+    return state
@@ -0,0 +1,391 @@
+import os
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import struct
+import threading
+import time
+
+from simulation import TICK_RATE, ROUND_TICKS, WIDTH, HEIGHT, STAGE, WINNERS, new_match, step
+
+# Spectator stream: the match is sent to viewers as per-tick state, not as
+# video. Each message is length prefixed:
+#   hello:    kind, then the match config as JSON (characters)
+#   keyframe: kind, tick, mask with every field set, every field
+#   delta:    kind, tick, mask of the fields that changed, those fields
+# Viewers get the hello and a keyframe when they connect, deltas after that.
+HELLO, KEYFRAME, DELTA = range(3)
+LENGTH = struct.Struct('<H')
+KIND = struct.Struct('<B')
+FRAME = struct.Struct('<BII')
+
+# What a viewer needs to draw a fighter: position, animation, frame, HP, size
+FIGHTER_FIELDS = (('x', 'f'), ('y', 'f'), ('animation', 'B'), ('frame', 'B'), ('hp', 'h'),
+                  ('scale', 'f'), ('transformed', 'B'), ('facing', 'b'))
+MATCH_FIELDS = (('game_over', 'B'), ('winner', 'B'))
+FIELD_FORMATS = [fmt for _ in range(2) for _, fmt in FIGHTER_FIELDS] + [fmt for _, fmt in MATCH_FIELDS]
+FIELD_STRUCTS = [struct.Struct('<' + fmt) for fmt in FIELD_FORMATS]
+
+# A viewer whose socket has more than this queued skips frames and
+# resynchronises with a keyframe once it has caught up
+MAX_BUFFER = 16 * 1024
+
+
+def state_fields(state):
+    fields = []
+    for fighter in state.fighters:
+        fields += (fighter.position.x, fighter.position.y, fighter.animation_id,
+                   fighter.frames_current, fighter.health_comp.current_hp, fighter.scale,
+                   fighter.transform_active, fighter.facing)
+    fields += (state.game_over, WINNERS.index(state.winner))
+    return tuple(fields)
+
+
+def _message(body):
+    return LENGTH.pack(len(body)) + body
+
+
+def encode_hello(config):
+    return _message(KIND.pack(HELLO) + json.dumps(config).encode('utf-8'))
+
+
+def encode_frame(tick, fields, previous=None):
+    mask = 0
+    values = []
+    for i, value in enumerate(fields):
+        if previous is None or previous[i] != value:
+            mask |= 1 << i
+            values.append(FIELD_STRUCTS[i].pack(value))
+    kind = KEYFRAME if previous is None else DELTA
+    return _message(FRAME.pack(kind, tick, mask) + b''.join(values))
+
+
+# Turns the byte stream back into messages and keeps the latest full state
+class StateDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.config = None
+        self.tick = 0
+        self.fields = None
+
+    def feed(self, data):
+        self.buffer += data
+        messages = 0
+        while len(self.buffer) >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(self.buffer)
+            if len(self.buffer) < LENGTH.size + length:
+                break
+            body = bytes(self.buffer[LENGTH.size:LENGTH.size + length])
+            del self.buffer[:LENGTH.size + length]
+            self.decode(body)
+            messages += 1
+        return messages
+
+    def decode(self, body):
+        (kind,) = KIND.unpack_from(body)
+        if kind == HELLO:
+            self.config = json.loads(body[KIND.size:].decode('utf-8'))
+            self.fields = None
+            return
+        kind, self.tick, mask = FRAME.unpack_from(body)
+        fields = [0] * len(FIELD_STRUCTS) if kind == KEYFRAME else list(self.fields)
+        offset = FRAME.size
+        for i, field in enumerate(FIELD_STRUCTS):
+            if mask & (1 << i):
+                (fields[i],) = field.unpack_from(body, offset)
+                offset += field.size
+        self.fields = fields
+
+
+class _Viewer:
+    __slots__ = ('writer', 'needs_keyframe')
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.needs_keyframe = True
+
+
+# Fans the stream out to any number of viewers. Every frame is encoded once
+# and written to all sockets; nothing waits on a slow viewer, its frames are
+# skipped instead (see MAX_BUFFER).
+class SpectatorServer:
+    def __init__(self, config, max_buffer=MAX_BUFFER):
+        self.hello = encode_hello(config)
+        self.max_buffer = max_buffer
+        self.viewers = set()
+        self.tick = 0
+        self.fields = None
+        self.skipped = 0
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=7100):
+        self.server = await asyncio.start_server(self.on_connect, host, port, backlog=1024)
+        return self.server
+
+    # Starts streaming to writer: the hello, then a keyframe (right away
+    # if the match is running, else with the first broadcast)
+    def add_viewer(self, writer, hello=None):
+        viewer = _Viewer(writer)
+        writer.write(hello or self.hello)
+        if self.fields is not None:
+            writer.write(encode_frame(self.tick, self.fields))
+            viewer.needs_keyframe = False
+        self.viewers.add(viewer)
+        return viewer
+
+    async def on_connect(self, reader, writer):
+        viewer = self.add_viewer(writer)
+        try:
+            # Viewers never send anything; wait for them to hang up
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            self.viewers.discard(viewer)
+            writer.close()
+
+    def broadcast(self, tick, fields):
+        delta = encode_frame(tick, fields, self.fields) if self.fields is not None else None
+        keyframe = None
+        self.tick, self.fields = tick, fields
+        for viewer in self.viewers:
+            transport = viewer.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > self.max_buffer:
+                viewer.needs_keyframe = True
+                self.skipped += 1
+                continue
+            if viewer.needs_keyframe or delta is None:
+                if keyframe is None:
+                    keyframe = encode_frame(tick, fields)
+                viewer.writer.write(keyframe)
+                viewer.needs_keyframe = False
+            else:
+                viewer.writer.write(delta)
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+        writers = [viewer.writer for viewer in self.viewers]
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for writer in writers), return_exceptions=True)
+        # Let the on_connect handlers finish
+        while self.viewers:
+            await asyncio.sleep(0)
+
+
+# SpectatorServer on a background thread, for main.py's synchronous loop
+class SpectatorBroadcaster:
+    def __init__(self, config, host='127.0.0.1', port=7100):
+        self.server = SpectatorServer(config)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(host, port), self.loop).result()
+
+    def publish(self, state):
+        self.loop.call_soon_threadsafe(self.server.broadcast, state.tick, state_fields(state))
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def apply_fields(fighters, fields):
+    size = len(FIGHTER_FIELDS)
+    for index, fighter in enumerate(fighters):
+        x, y, animation, frame, hp, scale, transformed, facing = fields[index * size:(index + 1) * size]
+        fighter.position.update(x, y)
+        if animation != fighter.animation_id:
+            fighter.set_animation(animation)
+        fighter.frames_current = frame
+        fighter.health_comp.current_hp = hp
+        fighter.scale = scale
+        fighter.transform_active = bool(transformed)
+        fighter.facing = facing
+        fighter.stage = STAGE
+
+
+# Draws a match from the stream with the same Sprite/Fighter code as the game.
+# With an arena it joins that arena on a server.py first, and when side is
+# 0 or 1 it plays that side with the WASD keys.
+def run_viewer(address, arena=None, side=-1):
+    import pygame
+    from classes import Sprite
+    from controls import KeyboardInput, PLAYER_KEYS, LEFT, RIGHT
+    from server import WATCH, encode_join, encode_input
+    from compositor import LayerCompositor, DirtyRectRenderer
+    from roster import create_fighters
+    from utils import update_timer, render_text
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("2D Fighting Game - spectator")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont("Arial", 36)
+    background = Sprite((0, 0), '../assets/img/background.png')
+    shop = Sprite((600, 128), '../assets/img/shop.png', scale=2.75, frames_max=6)
+    scene = LayerCompositor((WIDTH, HEIGHT), background, animated=[shop])
+    renderer = DirtyRectRenderer(scene)
+
+    sock = socket.create_connection(address)
+    if arena is not None:
+        sock.sendall(encode_join(arena, side))
+    sock.setblocking(False)
+    playing = arena is not None and side != WATCH
+    keyboard = KeyboardInput(PLAYER_KEYS)
+    sent = 0
+    decoder = StateDecoder()
+    fighters = None
+    config = None
+
+    running = True
+    while running:
+        clock.tick(TICK_RATE)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type in (pygame.KEYDOWN, pygame.KEYUP):
+                keyboard.handle_event(event)
+
+        if playing:
+            bits = keyboard.poll()
+            # Held directions stick on the server until the next message,
+            # so only changes and presses need sending
+            if bits != sent or bits & ~(LEFT | RIGHT):
+                try:
+                    sock.send(encode_input(bits))
+                    sent = bits
+                except BlockingIOError:
+                    pass
+
+        try:
+            data = sock.recv(65536)
+            if not data:
+                running = False
+            decoder.feed(data)
+        except BlockingIOError:
+            pass
+
+        if decoder.config is not config:
+            config = decoder.config
+            if 'error' in config:
+                print(config['error'])
+                break
+            previous = fighters
+            fighters = create_fighters(*config['characters'])
+            if previous:
+                # A different match: drop the sheets only the old fighters used
+                for fighter in previous:
+                    fighter.release_assets()
+                assets.purge()
+            fighters[1].health_bar.rect.x = WIDTH - fighters[1].health_bar.rect.width - 20
+
+        scene.advance()
+        renderer.begin(screen)
+        if fighters and decoder.fields is not None:
+            apply_fields(fighters, decoder.fields)
+            for fighter in fighters:
+                fighter.draw(screen)
+                fighter.health_bar.draw(screen)
+            update_timer(screen, font, max(0, (ROUND_TICKS - decoder.tick) // TICK_RATE))
+            if decoder.fields[-2]:
+                render_text(screen, WINNERS[decoder.fields[-1]], font)
+        renderer.present()
+
+    sock.close()
+    pygame.quit()
+
+
+async def _bench_viewer(address, stats, done):
+    reader, writer = await asyncio.open_connection(*address)
+    decoder = StateDecoder()
+    received = 0
+    while not done.is_set():
+        data = await reader.read(65536)
+        if not data:
+            break
+        received += len(data)
+        decoder.feed(data)
+    writer.close()
+    stats.append((received, decoder))
+
+
+# Streams a headless match to many in-process viewers and reports the
+# bandwidth per viewer
+async def run_bench(viewers=300, ticks=1800, port=7100, seed=0):
+    from batch import ChasePolicy
+
+    state = new_match()
+    server = SpectatorServer({'characters': [f.name for f in state.fighters]})
+    await server.start('127.0.0.1', port)
+    done = asyncio.Event()
+    stats = []
+    tasks = [asyncio.create_task(_bench_viewer(('127.0.0.1', port), stats, done)) for _ in range(viewers)]
+    while len(server.viewers) < viewers:
+        await asyncio.sleep(0.01)
+
+    rng = random.Random(seed)
+    policies = [ChasePolicy(rng), ChasePolicy(rng)]
+    loop = asyncio.get_running_loop()
+    interval = 1 / TICK_RATE
+    next_time = loop.time()
+    broadcast_time = 0.0
+    for _ in range(ticks):
+        step(state, [policy(state, i) for i, policy in enumerate(policies)])
+        started = time.perf_counter()
+        server.broadcast(state.tick, state_fields(state))
+        broadcast_time += time.perf_counter() - started
+        next_time += interval
+        await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+    await asyncio.sleep(0.5)
+    done.set()
+    await server.close()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    expected = list(state_fields(state))
+    in_sync = sum(1 for _, decoder in stats
+                  if decoder.tick == state.tick and
+                  all(struct.pack('<' + f, a) == struct.pack('<' + f, b)
+                      for f, a, b in zip(FIELD_FORMATS, decoder.fields, expected)))
+    seconds = ticks / TICK_RATE
+    return {
+        'viewers': viewers,
+        'ticks': ticks,
+        'viewers_in_sync': in_sync,
+        'bytes_per_viewer_per_second': round(sum(r for r, _ in stats) / len(stats) / seconds, 1),
+        'broadcast_ms_per_tick': round(broadcast_time / ticks * 1000, 3),
+        'skipped_frames': server.skipped,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a match streamed by main.py --spectate-port, "
+                                                 "or join an arena on server.py.")
+    parser.add_argument('address', nargs='?', default='127.0.0.1:7100', help="HOST:PORT of the game")
+    parser.add_argument('--arena', type=int, help="arena to join on a server.py")
+    parser.add_argument('--side', type=int, choices=(-1, 0, 1), default=-1,
+                        help="side of the --arena to play with WASD, or -1 to watch")
+    parser.add_argument('--bench', type=int, metavar='VIEWERS',
+                        help="instead of watching, stream a headless match to this many viewers")
+    parser.add_argument('--ticks', type=int, default=1800, help="length of the --bench match")
+    args = parser.parse_args(argv)
+
+    host, _, port = args.address.rpartition(':')
+    address = (host or '127.0.0.1', int(port))
+    if args.bench:
+        print(json.dumps(asyncio.run(run_bench(args.bench, args.ticks, address[1]))))
+    else:
+        run_viewer(address, args.arena, args.side)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+import pygame
+
+
+# LRU cache of rendered strings, keyed by (font, text, color, antialias), so
+# HUD text is only rasterized when its content actually changes.
+class TextCache:
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # Pre-rendered '0'-'9' glyphs per (font, color, antialias)
+        self.digit_atlases = {}
+
+    def render(self, font, text, antialias, color):
+        key = (font, text, tuple(color), antialias)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            return surface
+
+        surface = font.render(text, antialias, color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def digits(self, font, antialias, color):
+        key = (font, tuple(color), antialias)
+        atlas = self.digit_atlases.get(key)
+        if atlas is None:
+            atlas = [font.render(str(d), antialias, color) for d in range(10)]
+            self.digit_atlases[key] = atlas
+        return atlas
+
+    def blit_number(self, surface, font, number, antialias, color, center):
+        # Assemble a non-negative integer from cached digit glyphs, no rasterizing
+        atlas = self.digits(font, antialias, color)
+        glyphs = [atlas[int(d)] for d in str(number)]
+        width = sum(glyph.get_width() for glyph in glyphs)
+        height = max(glyph.get_height() for glyph in glyphs)
+        rect = pygame.Rect(0, 0, width, height)
+        rect.center = center
+
+        x = rect.x
+        for glyph in glyphs:
+            surface.blit(glyph, (x, rect.y))
+            x += glyph.get_width()
+        return rect
+
+    def clear(self):
+        self.entries.clear()
+        self.digit_atlases.clear()
+
+
+text_cache = TextCache()
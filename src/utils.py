@@ -1,4 +1,5 @@
 import pygame
+from text_cache import text_cache
 
 # Collision detection using Fighter attributes
 def rectangular_collision(attacker, target):
@@ -14,35 +15,30 @@ def rectangular_collision(attacker, target):
         ay <= ty + th
     )
 
-# Display winner text on the screen
-def determine_winner(player, enemy, font, screen):
+def winner_text(player, enemy):
     #if player.health == enemy.health:
     if player.health_comp.current_hp == enemy.health_comp.current_hp:
-        text = "Tie"
+        return "Tie"
     #elif player.health > enemy.health:
     elif player.health_comp.current_hp > enemy.health_comp.current_hp:
-        text = "Player 1 Wins"
+        return "Player 1 Wins"
     else:
-        text = "Player 2 Wins"
+        return "Player 2 Wins"
 
-    render_text(screen, text, font)
+# Display winner text on the screen
+def determine_winner(player, enemy, font, screen):
+    return render_text(screen, winner_text(player, enemy), font)
 
 # Render centered text
 def render_text(screen, text, font):
-    surface = font.render(text, True, (255, 255, 255))
+    surface = text_cache.render(font, text, True, (255, 255, 255))
     rect = surface.get_rect(center=(screen.get_width() // 2, screen.get_height() // 2))
-    screen.blit(surface, rect)
-
-
-def update_timer(screen, font, start_time, player, enemy, game_over_flag):
-    elapsed = pygame.time.get_ticks() - start_time
-    remaining = max(0, (60000 - elapsed) // 1000)
+    return screen.blit(surface, rect)
 
-    if remaining == 0 and not game_over_flag[0]:
-        determine_winner(player, enemy, font, screen)
-        game_over_flag[0] = True
 
-    timer_surface = font.render(str(remaining), True, (255, 255, 255))
-    rect = timer_surface.get_rect(center=(screen.get_width() // 2, 20))
-    screen.blit(timer_surface, rect)
+# The round timeout itself is decided by the simulation; this only draws it
+def update_timer(screen, font, remaining):
+    # Digits come from a pre-rendered atlas, so the timer never rasterizes text
+    return text_cache.blit_number(screen, font, remaining, True, (255, 255, 255),
+                                  (screen.get_width() // 2, 20))
 
@@ -0,0 +1,24 @@
+import pygame
+from animation import FLASH
+
+# Sprite variants: every frame can be drawn mirrored and/or tinted. A
+# variant is (flipped, tint), where tint is None, FLASH for the white
+# hit-flash silhouette, or an (r, g, b) multiplier for palette swaps. The
+# atlas renders each variant once for whole pages when it packs, and the
+# frame cache keeps the scaled results, so drawing a variant is the same
+# plain blit as drawing the original.
+PLAIN = (False, None)
+
+
+def apply_variant(surface, variant):
+    flipped, tint = variant
+    if tint is not None:
+        surface = surface.copy()
+        if tint == FLASH:
+            # Every visible pixel turns white, transparency stays as it was
+            surface.fill((255, 255, 255, 0), special_flags=pygame.BLEND_RGBA_MAX)
+        else:
+            surface.fill(tuple(tint) + (255,), special_flags=pygame.BLEND_RGBA_MULT)
+    if flipped:
+        surface = pygame.transform.flip(surface, True, False)
+    return surface